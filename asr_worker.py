@@ -0,0 +1,157 @@
+# ASR独立进程
+# 模型只在这个进程中加载，主进程通过本地socket发送成批的音频，识别结果按批次编号返回。
+# 作为独立脚本启动而不是用multiprocessing派生，避免子进程重新执行主程序的模块代码。
+
+import os
+import sys
+import subprocess
+import itertools
+import secrets
+from io import BytesIO
+from threading import Thread, Lock
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+
+
+def load_asr_model():
+    from funasr import AutoModel
+    try:
+        model_dir = "./utilss/models/SenseVoiceSmall"
+        asr_model = AutoModel(
+            model=model_dir,
+            disable_update=True,
+            device="cuda:0",
+            fp16=True,      # GPU上使用半精度推理
+        )
+    except:
+        print("[提示]未安装ASR模型，开始自动安装ASR模型。")
+        from modelscope import snapshot_download
+        model_dir = snapshot_download(
+            model_id="iic/SenseVoiceSmall",
+            local_dir="./utilss/models/SenseVoiceSmall",
+            revision="master"
+        )
+        model_dir = "./utilss/models/SenseVoiceSmall"
+        asr_model = AutoModel(
+            model=model_dir,
+            disable_update=True,
+            # device="cuda:0",
+            device="cpu",
+        )
+    return asr_model
+
+
+# 一次generate识别多段音频，返回与输入顺序一致的文本列表
+def transcribe(asr_model, audio_datas: list) -> list:
+    from funasr.utils.postprocess_utils import rich_transcription_postprocess
+    res = asr_model.generate(
+        input=[BytesIO(audio_data) for audio_data in audio_datas],
+        cache={},
+        language="zh", # "zh", "en", "yue", "ja", "ko", "nospeech"
+        ban_emo_unk=True,
+        use_itn=False,
+        batch_size=len(audio_datas),
+    )
+    texts = []
+    for r in res:
+        text = str(rich_transcription_postprocess(r["text"])).replace(" ", "")
+        texts.append(text if text else None)
+    return texts
+
+
+# 整批识别失败时逐条重试，返回 [(文本, 错误信息)]，单条音频出错不影响同批的其他请求
+def transcribe_each(asr_model, audio_datas: list) -> list:
+    try:
+        return [(text, None) for text in transcribe(asr_model, audio_datas)]
+    except Exception as e:
+        if len(audio_datas) == 1:
+            return [(None, str(e))]
+    results = []
+    for audio_data in audio_datas:
+        try:
+            results.append((transcribe(asr_model, [audio_data])[0], None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+def worker_main(host: str, port: int, authkey: bytes):
+    conn = Client((host, port), authkey=authkey)
+    asr_model = load_asr_model()
+    while True:
+        try:
+            batch_id, audio_datas = conn.recv()
+        except EOFError:
+            break
+        conn.send((batch_id, transcribe_each(asr_model, audio_datas)))
+
+
+class ASRWorker:
+    """
+    主进程一侧的ASR进程句柄，submit返回concurrent.futures.Future，可在线程或协程中等待。
+    Future的结果与输入音频一一对应，识别失败的音频对应位置是异常对象。
+    ASR进程意外退出后，下一次submit时自动重新启动。
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.ids = itertools.count()
+        self.process = None
+        self.conn = None
+        self.pending = None
+        self.start()
+
+    # 启动ASR进程并建立连接，调用方需持有self.lock（初始化时除外）
+    def start(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        authkey = secrets.token_bytes(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = listener.address
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), host, str(port), authkey.hex()],
+        )
+        self.conn = listener.accept()
+        listener.close()
+        # 每个连接单独记录未完成的批次，旧连接断开时只处理属于它的请求
+        self.pending = {}
+        Thread(target=self.collect, args=(self.conn, self.pending), daemon=True).start()
+
+    def submit(self, audio_datas: list) -> Future:
+        fut = Future()
+        with self.lock:
+            batch_id = next(self.ids)
+            for _ in range(2):
+                if self.conn is None:
+                    print("[提示]ASR进程已退出，正在重新启动。")
+                    self.start()
+                self.pending[batch_id] = fut
+                try:
+                    self.conn.send((batch_id, audio_datas))
+                    return fut
+                except (BrokenPipeError, OSError):
+                    self.pending.pop(batch_id, None)
+                    self.conn.close()
+                    self.conn = None
+            fut.set_exception(RuntimeError("ASR进程已退出"))
+        return fut
+
+    def collect(self, conn, pending: dict):
+        while True:
+            try:
+                batch_id, results = conn.recv()
+            except (EOFError, OSError):
+                with self.lock:
+                    if self.conn is conn:
+                        self.conn = None
+                    for fut in pending.values():
+                        fut.set_exception(RuntimeError("ASR进程已退出"))
+                    pending.clear()
+                break
+            with self.lock:
+                fut = pending.pop(batch_id)
+            fut.set_result([RuntimeError(err) if err else text for text, err in results])
+
+
+if __name__ == "__main__":
+    worker_main(sys.argv[1], int(sys.argv[2]), bytes.fromhex(sys.argv[3]))
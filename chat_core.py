@@ -1,47 +1,30 @@
 from utilss import config as CConfig
-import requests
+import os
+import httpx
 import json
+import orjson
 import time
 import asyncio
-from threading import Thread
-import base64
-from fastapi.responses import JSONResponse
-from io import BytesIO
+try:
+    import pybase64 as base64   # SIMD加速的base64，接口与标准库一致
+except ImportError:
+    import base64
+import hashlib
+from collections import OrderedDict
 from pydantic import BaseModel
-from funasr import AutoModel
-from funasr.utils.postprocess_utils import rich_transcription_postprocess
+from asr_worker import ASRWorker
 from utilss.sv import SV
 from utilss.agent import Agent
+from utilss.micro_batcher import MicroBatcher
 import re
-import jionlp
 from plugins.financial.plugin import financial_plugin_hook
 
 
 if CConfig.config["Agent"]["is_up"]:
     agent = Agent()
 
-try:
-    model_dir = "./utilss/models/SenseVoiceSmall"
-    asr_model = AutoModel(
-        model=model_dir,
-        disable_update=True,
-        device="cuda:0",
-    )
-except:
-    print("[提示]未安装ASR模型，开始自动安装ASR模型。")
-    from modelscope import snapshot_download
-    model_dir = snapshot_download(
-        model_id="iic/SenseVoiceSmall",
-        local_dir="./utilss/models/SenseVoiceSmall",
-        revision="master"
-    )
-    model_dir = "./utilss/models/SenseVoiceSmall"
-    asr_model = AutoModel(
-        model=model_dir,
-        disable_update=True,
-        # device="cuda:0",
-        device="cpu",
-    )
+# ASR模型运行在独立进程中，避免推理阻塞接口线程
+asr_worker = ASRWorker()
 
 # 载入声纹识别模型
 sv_pipeline = ""
@@ -51,10 +34,107 @@ if CConfig.config["Core"]["sv"]["is_up"]:
 else:
     is_sv = False
 
-# 提交到大模型
-def to_llm(msg: list, res_msg_list: list, full_msg: list):
+# 大模型请求共用的连接池，启用HTTP/2复用连接（未安装h2时退回HTTP/1.1 keep-alive）
+_LLM_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+_LLM_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+try:
+    LLM_CLIENT = httpx.AsyncClient(http2=True, timeout=_LLM_TIMEOUT, limits=_LLM_LIMITS)
+except ImportError:
+    LLM_CLIENT = httpx.AsyncClient(timeout=_LLM_TIMEOUT, limits=_LLM_LIMITS)
+# GSV语音合成共用的连接池，保持长连接避免每句话重新建立TCP连接
+GSV_CLIENT = httpx.AsyncClient(
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=16, max_connections=64),
+)
+
+# 预编译的正则，流式分句时括号开合与断句标点合并为一个匹配
+_SPLIT_RE = re.compile(r'[(（\[{]|[)）\]}]|[…~～。？！?!,，]')
+_PAREN_STRIP_RE = re.compile(r'[$(（\[].*?[\]）)]')
+_EMOTION_RE = re.compile(r'\[(.*?)\]')
+_IMAGE_TAG_RE = re.compile(r'\{(image|meme|pics):.*?\}')
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+_OPEN_BRACKETS = "(（[{"
+_CLOSE_BRACKETS = ")）]}"
+_SOFT_PUNCTUATION = "…~～,，"
+
+def _append_delta(buf: str, delta: str) -> str:
+    """追加增量文本，只对新增部分（连同前两个字符，防止"..."被分片截断）做省略号替换"""
+    head = max(len(buf) - 2, 0)
+    return buf[:head] + (buf[head:] + delta).replace("...", "…")
+
+def _find_split_point(tmp_msg: str, is_first: bool, state: list) -> int:
+    """
+    查找下一个断句位置，找不到返回-1。
+    state为[已扫描到的位置, 括号深度]，未找到时会记录扫描进度，下次只扫描新追加的文本；
+    找到断句位置后调用方需要重置为[0, 0]。
+    """
+    stat = state[1]
+    for m in _SPLIT_RE.finditer(tmp_msg, state[0]):
+        c = m.group()
+        if c in _OPEN_BRACKETS:
+            stat += 1
+            continue
+        if c in _CLOSE_BRACKETS:
+            stat -= 1
+            continue
+        if stat != 0:
+            continue
+        end = m.end()
+        # 非首句遇到软标点时，去掉括号内容后不足10个字则继续累积
+        if c in _SOFT_PUNCTUATION and not is_first and len(_PAREN_STRIP_RE.sub('', tmp_msg[:end])) <= 10:
+            continue
+        return m.start()
+    # 末尾的"."可能和后续文本合并成"…"，留到下次重新扫描
+    state[0] = len(tmp_msg.rstrip("."))
+    state[1] = stat
+    return -1
+
+# 大模型回复缓存，按请求内容的哈希保存原始SSE行，需在配置中开启LLM.cache
+LLM_CACHE_DIR = "./cache/llm"
+
+def _llm_cache_path(data: dict) -> str:
+    key = hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    return os.path.join(LLM_CACHE_DIR, key[:2], f"{key}.sse")
+
+# 按行切分SSE字节流，直接产出bytes，不做逐行解码
+async def _aiter_byte_lines(response):
+    buf = b""
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if buf:
+        yield buf
+
+def _read_llm_cache(path: str) -> list:
+    with open(path, "rb") as f:
+        return f.read().split(b"\n")
+
+def _write_llm_cache(path: str, lines: list):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\n".join(lines))
+
+# 回放缓存的SSE行，每行之间让出事件循环，保持和实时流一样的流水线节奏
+async def _replay_llm_cache(path: str):
+    lines = await asyncio.to_thread(_read_llm_cache, path)
+    for line in lines:
+        yield line
+        await asyncio.sleep(0)
+
+# 转发SSE行的同时记录在内存中，流完整结束后在线程中一次性写入缓存，不阻塞事件循环
+async def _record_llm_cache(lines, path: str):
+    recorded = []
+    async for line in lines:
+        recorded.append(line)
+        yield line
+    await asyncio.to_thread(_write_llm_cache, path, recorded)
+
+# 提交到大模型，断好的句子写入text_q，结束时写入"DONE_DONE"
+async def to_llm(msg: list, text_q: asyncio.Queue, full_msg: list):
     def get_emotion(msg: str):
-        res = re.findall(r'\[(.*?)\]', msg)
+        res = _EMOTION_RE.findall(msg)
         if len(res) > 0:
             match = res[-1]
             if match and CConfig.config["extra_ref_audio"]:
@@ -75,61 +155,58 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list):
         data.update(CConfig.config["LLM"]["extra_config"])
     data["messages"] = msg
 
+    cache_path = _llm_cache_path(data) if CConfig.config["LLM"].get("cache", False) else ""
+
     t_t = time.time()
-    try:
-        response = requests.post(url = CConfig.config["LLM"]["api"], json=data, headers=headers,stream=True)
-    except:
-        print("无法链接到LLM服务器")
-        return JSONResponse(status_code=400, content={"message": "无法链接到LLM服务器"})
+    response = None
+    if cache_path and os.path.exists(cache_path):
+        lines = _replay_llm_cache(cache_path)
+    else:
+        try:
+            request = LLM_CLIENT.build_request("POST", CConfig.config["LLM"]["api"], json=data, headers=headers)
+            response = await LLM_CLIENT.send(request, stream=True)
+        except Exception:
+            # 只捕获普通异常，客户端断开时的取消需要继续向上传递
+            print("无法链接到LLM服务器")
+            full_msg.append("")
+            await text_q.put("DONE_DONE")
+            return
+        lines = _aiter_byte_lines(response)
+        if cache_path and response.status_code == 200:
+            lines = _record_llm_cache(lines, cache_path)
     
     # 信息处理
-    # biao_dian_2 = ["…", "~", "～", "。", "？", "！", "?", "!"]
-    biao_dian_3 = ["…", "~", "～", "。", "？", "！", "?", "!", ",", "，"]
-    biao_dian_4 = ["…", "~", "～",  ",", "，"]
-
     res_msg = ""
     tmp_msg = ""
     j = True
     j2 = True
+    split_state = [0, 0]
     ref_audio = ""
     ref_text = ""
-    # biao_tmp = biao_dian_3
-    for line in response.iter_lines():
-        if line:
-            try:
-                if j:
-                    print(f"\n[大模型延迟]{time.time() - t_t}")
-                    t_t = time.time()
-                    j = False
-                decoded_line = line.decode('utf-8')
-                if decoded_line.startswith("data:"):
-                    data_str = decoded_line[5:].strip()
-                    if data_str:
-                        msg_t = json.loads(data_str)["choices"][0]["delta"]["content"]
-                        res_msg += msg_t
-                        tmp_msg += msg_t
-                res_msg = res_msg.replace("...", "…")
-                tmp_msg = tmp_msg.replace("...", "…")
-            except:
-                err = line.decode("utf-8")
-                print(f"[错误]：{err}")
-                continue
-            # if not tmp_msg:
-            #     continue
-            ress = ""
-            stat = 0
-            for ii in range(len(tmp_msg)):
-                if tmp_msg[ii] in ["(", "（", "[", "{"]:
-                    stat += 1
-                    continue
-                if tmp_msg[ii] in [")", "）", "]", "}"]:
-                    stat -= 1
-                    continue
-                if stat != 0:
-                    continue
-                if tmp_msg[ii] not in biao_dian_3:
+    # 取消或异常时也要关闭流式响应，否则连接无法归还连接池
+    try:
+        async for line in lines:
+            if line:
+                try:
+                    if j:
+                        print(f"\n[大模型延迟]{time.time() - t_t}")
+                        t_t = time.time()
+                        j = False
+                    if line.startswith(b"data:"):
+                        payload = line[5:].strip()
+                        if payload == b"[DONE]":
+                            continue
+                        if payload:
+                            msg_t = orjson.loads(payload)["choices"][0]["delta"]["content"]
+                            res_msg = _append_delta(res_msg, msg_t)
+                            tmp_msg = _append_delta(tmp_msg, msg_t)
+                except:
+                    print(f"[错误]：{line.decode('utf-8', errors='replace')}")
                     continue
-                if (tmp_msg[ii] in biao_dian_4) and j2 == False and len(re.sub(r'[$(（[].*?[]）)]', '', tmp_msg[:ii+1])) <= 10:
+                # if not tmp_msg:
+                #     continue
+                ii = _find_split_point(tmp_msg, j2, split_state)
+                if ii < 0:
                     continue
 
                 # 提取文本中的情绪标签，并设置参考音频
@@ -139,7 +216,7 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list):
                         ref_audio = CConfig.config["extra_ref_audio"][emotion][0]
                         ref_text = CConfig.config["extra_ref_audio"][emotion][1]
                 ress = tmp_msg[:ii+1]
-                ress = jionlp.remove_html_tag(ress)
+                ress = _HTML_TAG_RE.sub('', ress)
                 ttt = ress
                 if j2:
                     print(f"\n[开始合成首句语音]{time.time() - t_t}")
@@ -149,20 +226,15 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list):
                                 ttt = ress[i+1:]
                             except:
                                 ttt = ""
-                # if not j2:
-                #     if len(re.sub(r'[$(（[].*?[]）)]', '', ttt)) < 4:
-                #         continue
                 if ttt:
-                    res_msg_list.append([ref_audio, ref_text, ttt])
-                # print(f"[合成文本]{ress}")
+                    await text_q.put([ref_audio, ref_text, ttt])
                 if j2:
                     j2 = False
-                try:
-                    tmp_msg = tmp_msg[ii+1:]
-                except:
-                    tmp_msg = ""
-                break
-
+                tmp_msg = tmp_msg[ii+1:]
+                split_state = [0, 0]
+    finally:
+        if response is not None:
+            await response.aclose()
 
     if len(tmp_msg) > 0:
         emotion = get_emotion(tmp_msg)
@@ -170,13 +242,13 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list):
             if emotion in CConfig.config["extra_ref_audio"]:
                 ref_audio = CConfig.config["extra_ref_audio"][emotion][0]
                 ref_text = CConfig.config["extra_ref_audio"][emotion][1]
-        res_msg_list.append([ref_audio, ref_text, tmp_msg])
+        await text_q.put([ref_audio, ref_text, tmp_msg])
 
     # 返回完整上下文 
-    res_msg = jionlp.remove_html_tag(res_msg)
+    res_msg = _HTML_TAG_RE.sub('', res_msg)
     if len(res_msg) == 0:
         full_msg.append(res_msg)
-        res_msg_list.append("DONE_DONE")
+        await text_q.put("DONE_DONE")
         return
     ttt = ""
     for i in range(len(res_msg)):
@@ -186,11 +258,10 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list):
             
     full_msg.append(ttt)
     print(full_msg)
-    # print(res_msg_list)
-    res_msg_list.append("DONE_DONE")
+    await text_q.put("DONE_DONE")
 
-def tts(datas: dict):
-    res = requests.post(CConfig.config["GSV"]["api"], json=datas, timeout=10)
+async def tts(datas: dict):
+    res = await GSV_CLIENT.post(CConfig.config["GSV"]["api"], json=datas)
     if res.status_code == 200:
         return res.content
     else:
@@ -200,8 +271,8 @@ def tts(datas: dict):
     
 
 def clear_text(msg: str):
-    msg = re.sub(r'\{(image|meme|pics):.*?\}', '', msg) # 新增：移除所有image和meme标签
-    msg = re.sub(r'[$(（[].*?[]）)]', '', msg)
+    msg = _IMAGE_TAG_RE.sub('', msg) # 新增：移除所有image和meme标签
+    msg = _PAREN_STRIP_RE.sub('', msg)
     msg = msg.replace(" ", "").replace("\n", "")
     tmp_msg = ""
     biao = ["…", "~", "～", "。", "？", "！", "?", "!",  ",",  "，"]
@@ -213,8 +284,60 @@ def clear_text(msg: str):
     return tmp_msg
 
 
+# 合成结果缓存，按请求参数的哈希索引，缓存总大小超出上限时淘汰最久未使用的条目
+# 上限可在配置 GSV.cache_max_mb 中设置，单位MB，默认32MB
+TTS_CACHE_MAX_MB = 32
+_tts_cache = OrderedDict()
+_tts_cache_bytes = 0
+
+def _tts_cache_key(datas: dict) -> bytes:
+    return hashlib.sha1(json.dumps(datas, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).digest()
+
+def _tts_cache_get(key: bytes):
+    audio_b64 = _tts_cache.get(key)
+    if audio_b64 is not None:
+        _tts_cache.move_to_end(key)
+    return audio_b64
+
+def _tts_cache_put(key: bytes, audio_b64: str):
+    global _tts_cache_bytes
+    max_bytes = int(CConfig.config["GSV"].get("cache_max_mb", TTS_CACHE_MAX_MB) * 1024 * 1024)
+    if len(audio_b64) > max_bytes:
+        return
+    old = _tts_cache.pop(key, None)
+    if old is not None:
+        _tts_cache_bytes -= len(old)
+    _tts_cache[key] = audio_b64
+    _tts_cache_bytes += len(audio_b64)
+    while _tts_cache_bytes > max_bytes:
+        _, evicted = _tts_cache.popitem(last=False)
+        _tts_cache_bytes -= len(evicted)
+
+# GSV请求参数模板，只在配置更新后重新生成，每句只需复制并填入文本和参考音频
+_gsv_template = {}
+_gsv_template_version = -1
+
+def _get_gsv_template() -> dict:
+    global _gsv_template, _gsv_template_version
+    if _gsv_template_version != CConfig.version:
+        gsv_config = CConfig.config["GSV"]
+        template = {
+            "text_lang": gsv_config["text_lang"],
+            "ref_audio_path": gsv_config["ref_audio_path"],
+            "prompt_text": gsv_config["prompt_text"],
+            "prompt_lang": gsv_config["prompt_lang"],
+            "seed": gsv_config["seed"],
+            "top_k": gsv_config["top_k"],
+            "batch_size": gsv_config["batch_size"],
+        }
+        if gsv_config["ex_config"]:
+            template.update(gsv_config["ex_config"])
+        _gsv_template = template
+        _gsv_template_version = CConfig.version
+    return _gsv_template
+
 # TTS并写入队
-def to_tts(tts_data: list):
+async def to_tts(tts_data: list):
     # def is_punctuation(char):
     #     return unicodedata.category(char).startswith('P')
     msg = clear_text(tts_data[2])
@@ -223,77 +346,63 @@ def to_tts(tts_data: list):
         return "None"
     ref_audio = tts_data[0]
     ref_text = tts_data[1]
-    datas = {
-        "text": msg,
-        "text_lang": CConfig.config["GSV"]["text_lang"],
-        "ref_audio_path": CConfig.config["GSV"]["ref_audio_path"],
-        "prompt_text": CConfig.config["GSV"]["prompt_text"],   
-        "prompt_lang": CConfig.config["GSV"]["prompt_lang"],
-        "seed": CConfig.config["GSV"]["seed"],
-        "top_k": CConfig.config["GSV"]["top_k"],
-        "batch_size": CConfig.config["GSV"]["batch_size"],
-    }
-    if CConfig.config["GSV"]["ex_config"]:
-        for key in CConfig.config["GSV"]["ex_config"]:
-            datas[key] = CConfig.config["GSV"]["ex_config"][key]
+    datas = _get_gsv_template().copy()
+    datas["text"] = msg
     if ref_audio:
         datas["ref_audio_path"] = ref_audio
         datas["prompt_text"] = ref_text
+    cache_key = _tts_cache_key(datas)
+    audio_b64 = _tts_cache_get(cache_key)
+    if audio_b64 is not None:
+        return audio_b64
     try:
-        byte_data = tts(datas)
+        byte_data = await tts(datas)
         audio_b64 = base64.urlsafe_b64encode(byte_data).decode("utf-8")
+        _tts_cache_put(cache_key, audio_b64)
         return audio_b64
     except:
         return "None"
 
-def ttts(res_list: list, audio_list: list):
-    i = 0
+# 同一次回复最多同时合成的句子数
+TTS_CONCURRENCY = 4
+
+# 从text_q取出句子并发合成，按句子顺序以(句子, 合成任务)写入audio_q
+async def ttts(text_q: asyncio.Queue, audio_q: asyncio.Queue):
+    sem = asyncio.Semaphore(TTS_CONCURRENCY)
+
+    async def bounded_tts(tts_data: list):
+        async with sem:
+            return await to_tts(tts_data)
+
     while True:
-        if i < len(res_list):
-            if res_list[i] == "DONE_DONE":
-                audio_list.append("DONE_DONE")
-                print(f"完成...")
-                break
-            # t_t = time.time()
-            audio_list.append(to_tts(res_list[i]))
-            # if i == 0:
-            #     print(f"\n[首句语音耗时]{time.time() - t_t}")
-            i += 1
-        time.sleep(0.05)
-
-
-# asr功能
-def asr(params: str):
-    global asr_model
-    global is_sv
-    global sv_pipeline
-
-    audio_data = base64.urlsafe_b64decode(params.encode("utf-8"))
+        tts_data = await text_q.get()
+        if tts_data == "DONE_DONE":
+            await audio_q.put("DONE_DONE")
+            print(f"完成...")
+            break
+        await audio_q.put((tts_data, asyncio.create_task(bounded_tts(tts_data))))
+
 
+# ASR请求合并器：把同时到达的多段音频合并成一批交给ASR进程识别，上一批识别完成后再处理下一批
+async def _asr_dispatch(audio_datas: list) -> list:
+    return await asyncio.wrap_future(asr_worker.submit(audio_datas))
+
+asr_batcher = MicroBatcher(_asr_dispatch, max_batch=8, max_wait_ms=15, concurrent=False)
+
+# 异步asr，供接口调用，并发请求会被合并识别
+async def asr_async(params: str):
+    return await asr_bytes_async(base64.urlsafe_b64decode(params.encode("utf-8")))
+
+# 直接接收wav字节的异步asr，同进程调用时省去base64编解码
+async def asr_bytes_async(audio_data: bytes):
     tt = time.time()
     if is_sv:
-        if not sv_pipeline.check_speaker(audio_data):
+        if not await asyncio.to_thread(sv_pipeline.check_speaker, audio_data):
             return None
-    # with open(f"./tmp/{tt}.wav", "wb") as file:
-    #     file.write(audio_data)
-    audio_data = BytesIO(audio_data)
-    res = asr_model.generate(
-        input=audio_data,
-        # input=f"{model.model_path}/example/zh.mp3",
-        cache={},
-        language="zh", # "zh", "en", "yue", "ja", "ko", "nospeech"
-        ban_emo_unk=True,
-        use_itn=False,
-        # batch_size=200,
-    )
-    # print(f"{model.model_path}/example/zh.mp3",)
-    text = str(rich_transcription_postprocess(res[0]["text"])).replace(" ", "")
-    # text = res[0]["text"]
+    text = await asr_batcher.submit(audio_data)
     print()
     print(f"[{time.time() - tt}]{text}\n\n")
-    if text:
-        return text
-    return None
+    return text
 
 # 新增函数处理prompt
 def _create_llm_prompt_for_financial_task(plugin_result: dict, original_msg_history: list) -> list:
@@ -374,29 +483,24 @@ async def text_llm_tts(params: tts_data, start_time):
     # ================== 2. 统一的LLM和TTS处理阶段 ==================
     # 无论消息来自插件包装还是常规聊天，最终都汇入到这里，使用同一套处理流水线
     
-    res_list = []
-    audio_list = []
+    text_q = asyncio.Queue()    # 断好句、等待合成的文本
+    audio_q = asyncio.Queue()   # 按顺序排列的(句子, 合成任务)
     full_msg = []
     
     print("[核心流程] 已将最终Prompt送入LLM和TTS处理流水线。")
     
-    # 将最终构建好的消息列表(msg_list_for_llm)传递给 to_llm 线程
-    llm_t = Thread(target=to_llm, args=(msg_list_for_llm, res_list, full_msg, ))
-    llm_t.daemon = True
-    llm_t.start()
-    
-    tts_t = Thread(target=ttts, args=(res_list, audio_list, ))
-    tts_t.daemon = True
-    tts_t.start()
+    # 将最终构建好的消息列表(msg_list_for_llm)传递给 to_llm 协程
+    llm_task = asyncio.create_task(to_llm(msg_list_for_llm, text_q, full_msg))
+    tts_task = asyncio.create_task(ttts(text_q, audio_q))
 
-    # ================== 3. 统一的流式返回阶段 (这部分代码来自您的原始版本，保持不变) ==================
-    i = 0
+    # ================== 3. 统一的流式返回阶段 ==================
     stat = True
     emotion_processed = False  # 标记是否已处理表情包
     
-    while True:
-        if i < len(audio_list):
-            if audio_list[i] == "DONE_DONE":
+    try:
+        while True:
+            item = await audio_q.get()
+            if item == "DONE_DONE":
                 # === 新增：在对话结束前处理表情包 ===
                 if not emotion_processed and len(full_msg) > 0 and full_msg[0]:
                     try:
@@ -429,18 +533,24 @@ async def text_llm_tts(params: tts_data, start_time):
                 # 发送结束信号
                 data = {"file": None, "message": full_msg[0], "done": True}
                 if CConfig.config["Agent"]["is_up"]:    # 刷新智能体上下文内容
-                    agent.add_msg(re.sub(r'<.*?>', '', full_msg[0]).strip())
-                yield f"data: {json.dumps(data)}\n\n"
+                    agent.add_msg(_HTML_TAG_RE.sub('', full_msg[0]).strip())
+                yield b"data: " + orjson.dumps(data) + b"\n\n"
                 break  # 结束循环
             
             # 发送音频和文本数据
-            data = {"file": audio_list[i], "message": res_list[i][2], "done": False}
+            tts_item, audio_task = item
+            data = {"file": await audio_task, "message": tts_item[2], "done": False}
             
             if stat:
                 print(f"\n[服务端首句处理耗时]{time.time() - start_time}\n")
                 stat = False
             
-            yield f"data: {json.dumps(data)}\n\n"
-            i += 1
-        
-        await asyncio.sleep(0.05)
\ No newline at end of file
+            yield b"data: " + orjson.dumps(data) + b"\n\n"
+    finally:
+        # 客户端断开时停止后台的LLM和TTS任务
+        llm_task.cancel()
+        tts_task.cancel()
+        while not audio_q.empty():
+            item = audio_q.get_nowait()
+            if item != "DONE_DONE":
+                item[1].cancel()
@@ -71,6 +71,7 @@ from utilss import config as CConfig
 from utilss import socket_asr as Socket_asr
 from utilss import log as Log
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import asyncio
@@ -322,8 +323,13 @@ def to_llm(msg: list, res_msg_list: list, full_msg: list, tmp_msg_list: list, ev
     # if CConfig.config["Agent"]["is_up"]:
     #     agent.lock.release()
 
+# GSV语音合成共用的会话，保持长连接避免每句话重新建立TCP连接
+GSV_SESSION = requests.Session()
+GSV_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+GSV_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+
 def tts(datas: dict):
-    res = requests.post(CConfig.config["GSV"]["api"], json=datas, timeout=10)
+    res = GSV_SESSION.post(CConfig.config["GSV"]["api"], json=datas, timeout=10)
     if res.status_code == 200:
         return res.content
     else:
@@ -601,8 +607,9 @@ async def websocket_endpoint(c_websocket: WebSocket):
                 current_speech_tmp.append(samples)
                 if len(current_speech_tmp) < 4:
                     continue
-                resampled = np.concatenate(current_speech_tmp.copy())
-                resampled = (resampled / 32768.0).astype(np.float32)
+                resampled = np.concatenate(current_speech_tmp)
+                # int16直接按float32缩放，一次遍历，不产生float64中间数组（乘2^-15与原来的除法结果完全一致）
+                resampled = np.multiply(resampled, np.float32(1.0 / 32768.0), dtype=np.float32)
                 current_speech_tmp = []
 
                 for speech_dict, speech_samples in vad_iterator(resampled):
@@ -94,7 +94,7 @@ class asr_data(BaseModel):
     data: str
 @app.post("/api/asr")
 async def asr_api(params: asr_data):
-    text = chat_core.asr(params.data)
+    text = await chat_core.asr_async(params.data)
     return text
 
 # vad接口
@@ -1,7 +1,9 @@
 # emotion/compute_acceptance_ratio.py
 
 import math
+from .jit import njit
 
+@njit(cache=True)
 def compute_acceptance_ratio(valence: float, impact_strength: float, inertia_factor: float = 1.5, k: float = math.e) -> float:
     """
     计算情绪接受度。
@@ -1,5 +1,8 @@
 # emotion/f_valence_map.py
 
+from .jit import njit
+
+@njit(cache=True)
 def f_valence_map(valence: float) -> float:
     """
     计算负向情绪的绝对值映射。
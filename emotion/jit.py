@@ -0,0 +1,10 @@
+# emotion/jit.py
+
+try:
+    from numba import njit
+except ImportError:
+    # 未安装numba时不做编译，原样返回函数
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
@@ -0,0 +1,31 @@
+# emotion/sentiment_batcher.py
+
+import asyncio
+import logging
+
+from utilss.micro_batcher import MicroBatcher
+
+logger = logging.getLogger("colored_logger.emotion")
+
+
+class SentimentBatcher(MicroBatcher):
+    """
+    情绪分析请求合并器。
+    收集短时间窗口内并发到达的多条消息，合成一次LLM请求分析；批量结果解析失败时退回逐条请求。
+    """
+    MAX_BATCH = 16      # 单个窗口最多合并的消息数
+    MAX_WAIT_MS = 20    # 收到首条消息后最多等待的时间
+
+    def __init__(self, request_one, request_many):
+        super().__init__(self.analyze, self.MAX_BATCH, self.MAX_WAIT_MS)
+        self.request_one = request_one      # async (text) -> dict | None
+        self.request_many = request_many    # async (texts) -> list[dict] | None
+
+    async def analyze(self, texts: list) -> list:
+        if len(texts) == 1:
+            return [await self.request_one(texts[0])]
+        results = await self.request_many(texts)
+        if results is None:
+            logger.warning("[情绪引擎] 警告: 批量情绪分析失败，改为逐条请求。")
+            results = await asyncio.gather(*(self.request_one(text) for text in texts))
+        return results
@@ -0,0 +1,80 @@
+# emotion/sentiment_cache.py
+
+import re
+import hashlib
+import asyncio
+import logging
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger("colored_logger.emotion")
+
+# 否定词：句向量对"我爱你"/"我不爱你"这类句子相似度很高，否定词不同的两句不能互相命中
+_NEGATION_RE = re.compile(r"[不没别无非未莫勿]|\b(?:not|no|never|none|nothing|nobody)\b|n't")
+
+
+class SentimentCache:
+    """
+    情绪分析结果的语义缓存。
+    先按规范化文本的哈希精确命中，未命中再用句向量余弦相似度查找最相近的一条，
+    相似度达到阈值且否定词一致时才算命中。
+    embedding模型在第一次查询时才加载，不拖慢启动。
+    """
+
+    def __init__(self, max_size: int = 256, threshold: float = 0.97):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.entries = OrderedDict()    # hash -> (向量, 分析结果, 否定词)
+        self.keys = []                  # 与 vects 行号对应的 hash
+        self.vects = None               # 归一化后的句向量矩阵
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.split()).lower()
+
+    @staticmethod
+    def _negations(text: str) -> tuple:
+        return tuple(sorted(_NEGATION_RE.findall(text)))
+
+    @staticmethod
+    def _embed(text: str) -> np.ndarray:
+        from utilss import embedding
+        vect = np.asarray(embedding.t2vect([text])[0], dtype=np.float32)
+        return vect / (np.linalg.norm(vect) or 1.0)
+
+    def _rebuild(self):
+        self.keys = list(self.entries.keys())
+        self.vects = np.stack([entry[0] for entry in self.entries.values()]) if self.entries else None
+
+    async def get(self, text: str):
+        """返回 (命中的分析结果或None, 查询用的key)，key 供未命中时 put 复用"""
+        normalized = self._normalize(text)
+        h = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        if h in self.entries:
+            self.entries.move_to_end(h)
+            return self.entries[h][1], (h, None, None)
+        negations = self._negations(normalized)
+        try:
+            vect = await asyncio.to_thread(self._embed, text)
+        except Exception as e:
+            logger.warning("[情绪引擎] 警告: 语义缓存计算向量失败 - %s", e)
+            return None, (h, None, None)
+        if self.vects is not None:
+            scores = self.vects @ vect
+            i = int(np.argmax(scores))
+            if scores[i] >= self.threshold:
+                _, analysis, cached_negations = self.entries[self.keys[i]]
+                if cached_negations == negations:
+                    self.entries.move_to_end(self.keys[i])
+                    return analysis, (h, vect, negations)
+        return None, (h, vect, negations)
+
+    def put(self, key: tuple, analysis: dict):
+        h, vect, negations = key
+        if vect is None:
+            return
+        self.entries[h] = (vect, analysis, negations)
+        self.entries.move_to_end(h)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self._rebuild()
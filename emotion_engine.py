@@ -1,18 +1,96 @@
 # emotion/emotion_engine.py
 
 import math
+import logging
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import datetime
+import time
 from enum import Enum
 import json
+import orjson
 import httpx
 import re
+import asyncio
+import numpy as np
 import os  # <--- 1. 新增导入 os 模块，用于检查文件是否存在
+try:
+    import rusty_req  # 可选，Rust实现的HTTP客户端，单次请求开销更低
+except ImportError:
+    rusty_req = None
 
 # 下级目录导入计算函数
 from emotion.f_valence_map import f_valence_map
 from emotion.compute_acceptance_ratio import compute_acceptance_ratio
 from emotion.compute_arousal_permission_factor import compute_arousal_permission_factor
 from emotion.create_mood_instruction import create_mood_instruction
+from emotion.sentiment_cache import SentimentCache
+from emotion.sentiment_batcher import SentimentBatcher
+from emotion.jit import njit
+
+# 挂在utilss.log的colored_logger下，沿用项目统一的日志格式和级别
+logger = logging.getLogger("colored_logger.emotion")
+
+
+class _ParentHandler(logging.Handler):
+    """在后台线程里把日志交给上级colored_logger的处理器输出"""
+
+    def emit(self, record):
+        logging.getLogger("colored_logger").handle(record)
+
+
+# 情绪引擎运行在事件循环里，日志先放进队列，由后台线程写终端，慢终端或管道不会阻塞对话
+_log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+logger.propagate = False
+_log_listener = QueueListener(_log_queue, _ParentHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# 从LLM回复中截取JSON对象（兼容被Markdown代码块包裹的情况）
+_JSON_BLOCK_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+_INV_E_MINUS_1 = 1.0 / (math.e - 1.0)
+
+# 潜在烦躁值的更新公式，纯数值计算，安装了numba时编译为机器码
+@njit(cache=True)
+def _latent_frustration(current_frustration, is_negative, impact_strength, current_valence, beta, max_bonus):
+    gamma = 1.0
+    eta = 0.5
+    v_abs = f_valence_map(current_valence)
+    new_frustration = beta * current_frustration
+    if is_negative:
+        mood_bonus = max_bonus * (math.exp(v_abs) - 1.0) * _INV_E_MINUS_1
+        amplified_impact = impact_strength * (1 + mood_bonus)
+        new_frustration += gamma * amplified_impact
+    new_frustration += eta * v_abs
+    return new_frustration
+
+# 情绪分析的系统提示词，每轮对话只有用户消息不同
+_SENTIMENT_SYSTEM_PROMPT = (
+    "You are a sophisticated social and emotional analysis expert. Your task is to analyze the LATEST user message. "
+    "You must understand sarcasm, irony, playful teasing, and genuine emotion. Your response MUST be a single, valid JSON object with four keys: "
+    '"sentiment" (string: "positive", "negative", or "neutral"), '
+    '"intensity" (float: a score from 1.0 to 5.0), '
+    '"intention" (string: a label like "genuine_praise", "neutral_statement", "harsh_insult"), '
+    'and "arousal_impact" (float: a score from -5.0 for calming to +5.0 for exciting).'
+)
+
+# 合并请求时使用的提示词，输入为消息的JSON数组，要求按顺序逐条返回分析结果
+_BATCH_SENTIMENT_SYSTEM_PROMPT = (
+    "You are a sophisticated social and emotional analysis expert. You will receive a JSON array of independent user messages. "
+    "Analyze EACH message on its own. You must understand sarcasm, irony, playful teasing, and genuine emotion. "
+    'Your response MUST be a single, valid JSON object with one key "results": an array with exactly one entry per input message, in the same order. '
+    "Each entry is an object with four keys: "
+    '"sentiment" (string: "positive", "negative", or "neutral"), '
+    '"intensity" (float: a score from 1.0 to 5.0), '
+    '"intention" (string: a label like "genuine_praise", "neutral_statement", "harsh_insult"), '
+    'and "arousal_impact" (float: a score from -5.0 for calming to +5.0 for exciting).'
+)
+
+_SENTIMENT_SYSTEM_MSG = {"role": "system", "content": _SENTIMENT_SYSTEM_PROMPT}
+_BATCH_SENTIMENT_SYSTEM_MSG = {"role": "system", "content": _BATCH_SENTIMENT_SYSTEM_PROMPT}
 
 class EmotionState(Enum):
     NORMAL = "正常"
@@ -21,7 +99,7 @@ class EmotionState(Enum):
 
 class EmotionEngine:
     def __init__(self, agent_config, llm_config):
-        print("情绪引擎已启动...")
+        logger.info("情绪引擎已启动...")
         self.STATE_FILE = "emotion_state.json"  # 定义状态文件的路径
         self.FRUSTRATION_THRESHOLD = agent_config.get("FRUSTRATION_THRESHOLD", 10.0)
         self.FRUSTRATION_DECAY_RATE = agent_config.get("FRUSTRATION_DECAY_RATE", 0.95)
@@ -29,42 +107,115 @@ class EmotionEngine:
         self.MELTDOWN_DURATION_MINUTES = agent_config.get("MELTDOWN_DURATION_MINUTES", 90.0)
         self.RECOVERY_DURATION_MINUTES = agent_config.get("RECOVERY_DURATION_MINUTES", 10.0)
         self.emotion_profile_matrix = agent_config.get("emotion_profile_matrix", [])
+        # 情绪档案矩阵按上界排序后拆成下界、上界、拉力三个连续数组，查找时二分定位区间
+        # 下界为-1.0的区间向下不封底、上界为1.0的区间向上不封顶，分别换成-inf/+inf
+        profile = np.array(sorted(self.emotion_profile_matrix, key=lambda row: row[1]), dtype=np.float64).reshape(-1, 3)
+        self._lowers = np.where(profile[:, 0] == -1.0, -np.inf, profile[:, 0])
+        self._uppers = np.where(profile[:, 1] == 1.0, np.inf, profile[:, 1])
+        self._pulls = np.ascontiguousarray(profile[:, 2])
         self.llm_api_for_sentiment = llm_config.get("api")
         self.llm_key_for_sentiment = llm_config.get("key")
         self.llm_model_for_sentiment = llm_config.get("model")
+        self.headers = {"Authorization": f"Bearer {self.llm_key_for_sentiment}", "Content-Type": "application/json"}
+        # 温度为0让相同输入得到相同结果，也提高缓存命中率
+        self._payload_base = {
+            "model": self.llm_model_for_sentiment,
+            "stream": False,
+            "temperature": 0.0,
+        }
+        # 是否用response_format强制JSON输出；接口不支持时会在首次被拒后自动关闭
+        self._use_response_format = llm_config.get("json_mode", True)
+        # 情绪分析请求共用的连接池，避免每轮对话重新握手（未安装h2时退回HTTP/1.1 keep-alive）
+        _limits = httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60)
+        try:
+            self.http_client = httpx.AsyncClient(http2=True, timeout=10.0, limits=_limits)
+        except ImportError:
+            self.http_client = httpx.AsyncClient(timeout=10.0, limits=_limits)
         self.TIME_SCALING_FACTOR = agent_config.get("TIME_SCALING_FACTOR", 5.0)
+        # 换算成秒，状态机里直接和单调时钟的差值比较
+        self._meltdown_dur_s = self.MELTDOWN_DURATION_MINUTES * 60.0
+        self._recovery_dur_s = self.RECOVERY_DURATION_MINUTES * 60.0
+        self._time_scaling_sq = (self.TIME_SCALING_FACTOR / 60.0) ** 2
+        # 熔断期的衰减曲线 1000/(x²+1000) 降到0.3（即valence回升到-0.3）所需的时间，和最长持续时间取较小者
+        self._meltdown_exit_s = min(
+            self._meltdown_dur_s,
+            math.sqrt((1000.0 / 0.3 - 1000.0) / self._time_scaling_sq) if self._time_scaling_sq > 0 else math.inf,
+        )
+        # 情绪分析结果的语义缓存，相同或相近的输入不再请求LLM
+        self.sentiment_cache = SentimentCache(
+            max_size=agent_config.get("sentiment_cache_size", 256),
+            threshold=agent_config.get("sentiment_cache_threshold", 0.97),
+        )
+        # 并发到达的情绪分析请求合并为一次LLM调用
+        self.sentiment_batcher = SentimentBatcher(self._request_sentiment, self._request_sentiment_batch)
 
         # 设置默认情绪状态
         self.valence = 0.0
         self.arousal = 0.0
         self.character_state = EmotionState.NORMAL
         self.latent_emotions = {"frustration": 0.0}
-        self.meltdown_start_time = None
+        self.meltdown_start_time = None  # time.monotonic() 时钟下的时间点，不受系统时间调整影响
 
         # 覆盖默认值
         self._load_state()
+        self._schedule_transition()
+
+        # 状态文件的写入合并：最多每 SAVE_INTERVAL_S 秒在后台线程写一次
+        self.SAVE_INTERVAL_S = 2.0
+        self._last_save = 0.0
+        self._save_handle = None
+        self._save_task = None
 
     # ave_state 用于保存, _load_state 用于加载
-    def _save_state(self):
-        """将当前情绪状态保存到文件"""
-        state_to_save = {
+    def _state_snapshot(self) -> dict:
+        return {
             "valence": self.valence,
             "arousal": self.arousal,
             "character_state": self.character_state.value,  # Enum 类型保存其字符串值
-            "latent_emotions": self.latent_emotions,
+            "latent_emotions": dict(self.latent_emotions),
             
-            "meltdown_start_time": self.meltdown_start_time.isoformat() if self.meltdown_start_time else None,
+            # 单调时钟跨进程无意义，保存时换算成墙上时间
+            "meltdown_start_time": datetime.datetime.fromtimestamp(
+                time.time() - (time.monotonic() - self.meltdown_start_time)
+            ).isoformat() if self.meltdown_start_time is not None else None,
         }
+
+    def _write_state(self, state_to_save: dict):
+        """先写临时文件再替换，写到一半崩溃也不会留下残缺的状态文件"""
+        tmp_file = self.STATE_FILE + ".tmp"
         try:
-            with open(self.STATE_FILE, 'w', encoding='utf-8') as f:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(state_to_save, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.STATE_FILE)
         except Exception as e:
-            print(f"[情绪引擎] 错误: 保存状态失败 - {e}")
+            logger.error("[情绪引擎] 错误: 保存状态失败 - %s", e)
+
+    def _save_state(self):
+        """将当前情绪状态保存到文件"""
+        self._write_state(self._state_snapshot())
+
+    def _request_save(self):
+        """标记状态需要保存，短时间内的多次变化只写一次文件"""
+        if self._save_handle is None:
+            delay = max(0.0, self._last_save + self.SAVE_INTERVAL_S - time.monotonic())
+            self._save_handle = asyncio.get_running_loop().call_later(delay, self._start_save)
+
+    def _start_save(self):
+        loop = asyncio.get_running_loop()
+        # 上一次写入还没完成时稍后再试，避免两个线程同时写临时文件
+        if self._save_task is not None and not self._save_task.done():
+            self._save_handle = loop.call_later(self.SAVE_INTERVAL_S, self._start_save)
+            return
+        self._save_handle = None
+        self._last_save = time.monotonic()
+        self._save_task = asyncio.ensure_future(asyncio.to_thread(self._write_state, self._state_snapshot()))
 
     def _load_state(self):
         """从文件加载情绪状态"""
         if not os.path.exists(self.STATE_FILE):
-            print("[情绪引擎] 状态文件不存在，使用默认值初始化。")
+            logger.info("[情绪引擎] 状态文件不存在，使用默认值初始化。")
             return
 
         try:
@@ -77,172 +228,249 @@ class EmotionEngine:
             self.character_state = EmotionState(loaded_state.get("character_state", self.character_state.value))
             self.latent_emotions = loaded_state.get("latent_emotions", self.latent_emotions)
 
-            # 恢复 datetime 对象
+            # 由墙上时间换算回单调时钟
             meltdown_time_str = loaded_state.get("meltdown_start_time")
-            self.meltdown_start_time = datetime.datetime.fromisoformat(meltdown_time_str) if meltdown_time_str else None
+            self.meltdown_start_time = time.monotonic() - (
+                time.time() - datetime.datetime.fromisoformat(meltdown_time_str).timestamp()
+            ) if meltdown_time_str else None
 
-            print(f"[情绪引擎] 成功从文件加载过往情绪状态 (V: {self.valence:.2f}, A: {self.arousal:.2f})。")
+            logger.info("[情绪引擎] 成功从文件加载过往情绪状态 (V: %.2f, A: %.2f)。", self.valence, self.arousal)
         except Exception as e:
-            print(f"[情绪引擎] 警告: 加载状态失败，将使用默认值。错误: {e}")
+            logger.warning("[情绪引擎] 警告: 加载状态失败，将使用默认值。错误: %s", e)
             # 加载失败，则保持 __init__ 中设置的默认值
 
 
     def _update_latent_emotions(self, current_frustration: float, sentiment: str, impact_strength: float, current_valence: float) -> float:
-        beta = self.FRUSTRATION_DECAY_RATE
-        gamma = 1.0
-        eta = 0.5
-        new_frustration = beta * current_frustration
-        if sentiment == "negative":
-            # 调用从外部导入的函数
-            v_abs = f_valence_map(current_valence)
-            mood_bonus = self.MAX_MOOD_AMPLIFICATION_BONUS * (math.exp(v_abs) - 1) / (math.e - 1)
-            amplified_impact = impact_strength * (1 + mood_bonus)
-            new_frustration += gamma * amplified_impact
-        # 调用从外部导入的函数
-        new_frustration += eta * f_valence_map(current_valence)
-        return new_frustration
+        return _latent_frustration(
+            float(current_frustration), sentiment == "negative", float(impact_strength), float(current_valence),
+            float(self.FRUSTRATION_DECAY_RATE), float(self.MAX_MOOD_AMPLIFICATION_BONUS),
+        )
 
     def _compute_valence_pull(self, valence: float, arousal_impact: float) -> float:
         if arousal_impact > 2.5:
             if valence > 0.8:
                 return 0.05
             return 0.0
-        for lower_bound, upper_bound, pull_strength in self.emotion_profile_matrix:
-            if lower_bound == -1.0 and valence <= upper_bound:
-                return pull_strength
-            if lower_bound < valence <= upper_bound:
-                return pull_strength
-            if upper_bound == 1.0 and valence > lower_bound:
-                return pull_strength
+        idx = int(np.searchsorted(self._uppers, valence, side="left"))
+        if idx < len(self._uppers) and valence > self._lowers[idx]:
+            return float(self._pulls[idx])
         return 0.0
 
-    # 核心流程函数
-    async def _update_emotion_state(self, text: str) -> tuple:
-
-        sentiment_system_prompt = (
-            "You are a sophisticated social and emotional analysis expert. Your task is to analyze the LATEST user message. "
-            "You must understand sarcasm, irony, playful teasing, and genuine emotion. Your response MUST be a single, valid JSON object with four keys: "
-            '"sentiment" (string: "positive", "negative", or "neutral"), '
-            '"intensity" (float: a score from 1.0 to 5.0), '
-            '"intention" (string: a label like "genuine_praise", "neutral_statement", "harsh_insult"), '
-            'and "arousal_impact" (float: a score from -5.0 for calming to +5.0 for exciting).'
-        )
-        messages_for_sentiment = [{"role": "system", "content": sentiment_system_prompt}, {"role": "user", "content": text}]
-        headers = {"Authorization": f"Bearer {self.llm_key_for_sentiment}", "Content-Type": "application/json"}
-        payload = {"model": self.llm_model_for_sentiment, "messages": messages_for_sentiment, "stream": False}
+    # 发送情绪分析请求，返回 (状态码, 响应体)；安装了rusty_req时优先使用，出错再退回httpx
+    async def _post_sentiment(self, payload: dict) -> tuple:
+        if rusty_req is not None:
+            try:
+                response = await rusty_req.fetch_single(
+                    url=self.llm_api_for_sentiment,
+                    method="POST",
+                    params=payload,
+                    headers=self.headers,
+                    timeout=10.0,
+                    tag="sentiment",
+                )
+                # 返回格式：{"http_status": int, "response": {"content": str, ...}, "exception": {"type", "message"}}
+                exception = response.get("exception") or {}
+                if any(exception.values()):
+                    raise RuntimeError(exception)
+                return int(response["http_status"]), response["response"]["content"]
+            except Exception as e:
+                logger.warning("[情绪引擎] 警告: rusty_req请求失败，改用httpx - %s", e)
+        response = await self.http_client.post(self.llm_api_for_sentiment, content=orjson.dumps(payload), headers=self.headers)
+        return response.status_code, response.content
+
+    # 请求LLM分析一条消息的情绪，失败时返回None
+    async def _request_sentiment(self, text: str) -> dict:
+
+        return await self._request_analysis(_SENTIMENT_SYSTEM_MSG, text)
+
+    # 一次请求分析多条消息，返回与输入顺序一致的列表，结果数量不符或解析失败时返回None
+    async def _request_sentiment_batch(self, texts: list) -> list:
+        analysis = await self._request_analysis(_BATCH_SENTIMENT_SYSTEM_MSG, orjson.dumps(texts).decode("utf-8"))
+        results = analysis.get("results") if isinstance(analysis, dict) else None
+        if not isinstance(results, list) or len(results) != len(texts) or not all(isinstance(r, dict) for r in results):
+            return None
+        return results
+
+    # 请求LLM并解析回复中的JSON对象，失败时返回None
+    async def _request_analysis(self, system_msg: dict, user_content: str) -> dict:
+        messages_for_sentiment = [system_msg, {"role": "user", "content": user_content}]
+        payload = {**self._payload_base, "messages": messages_for_sentiment}
+        if self._use_response_format:
+            payload["response_format"] = {"type": "json_object"}
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(self.llm_api_for_sentiment, json=payload, headers=headers)
-            
-            if response.status_code == 200:
+            status_code, body = await self._post_sentiment(payload)
+            if status_code in (400, 422) and "response_format" in payload:
+                # 部分兼容接口不认识response_format，去掉后重试一次，之后的请求也不再携带
+                logger.warning("[情绪引擎] 警告: 接口不支持response_format（状态码 %s），改为普通输出重试。", status_code)
+                self._use_response_format = False
+                del payload["response_format"]
+                status_code, body = await self._post_sentiment(payload)
+
+            if status_code == 200:
                 try:
-                    llm_content_str = response.json()["choices"][0]["message"]["content"]
-                except (KeyError, IndexError, TypeError):
-                    print("[情绪引擎] 错误: LLM返回的JSON结构不完整。")
-                    return self.valence, self.arousal, "neutral", 0.0
-
-                json_match = re.search(r'\{.*\}', llm_content_str, re.DOTALL)
-                
-                if not json_match:
-                    print("[情绪引擎] 警告: 在LLM的返回中未找到有效的JSON结构。")
-                    return self.valence, self.arousal, "neutral", 0.0
+                    llm_content_str = orjson.loads(body)["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError, ValueError):
+                    logger.error("[情绪引擎] 错误: LLM返回的JSON结构不完整。")
+                    return None
 
-                cleaned_json_str = json_match.group(0)
+                # 已通过response_format要求返回纯JSON，直接解析
+                try:
+                    return orjson.loads(llm_content_str)
+                except orjson.JSONDecodeError:
+                    pass
 
+                # 不支持response_format的接口仍可能用代码块包裹，再截取一次
+                json_match = _JSON_BLOCK_RE.search(llm_content_str)
                 try:
-                    analysis = json.loads(cleaned_json_str)
-                except json.JSONDecodeError:
-                    print("[情绪引擎] 警告: 清洗后的字符串依然不是有效的JSON，本轮情绪无变化。")
-                    return self.valence, self.arousal, "neutral", 0.0
-
-                sentiment = analysis.get("sentiment", "neutral")
-                intensity = float(analysis.get("intensity", 0.0))
-                arousal_impact = float(analysis.get("arousal_impact", 0.0))
-                
-                if sentiment == "neutral":
-                    new_valence = self.valence
-                    impact_strength = 0.0
-                else:
-                    impact_strength = (intensity / 8.1) ** 1.1
-                    potential_delta = impact_strength if sentiment == "positive" else -impact_strength
-
-                    acceptance_ratio = compute_acceptance_ratio(self.valence, impact_strength)
-                    final_delta = potential_delta * acceptance_ratio
-                    new_valence = self.valence + final_delta
-                
-                base_delta_arousal = arousal_impact / 10.0
-
-                permission_factor = compute_arousal_permission_factor(self.arousal)
-                damped_delta_arousal = base_delta_arousal * permission_factor
-                valence_pull = self._compute_valence_pull(new_valence, arousal_impact)
-                new_arousal = self.arousal + damped_delta_arousal + valence_pull
-                
-                final_valence = max(-1.0, min(1.0, new_valence))
-                final_arousal = max(0.0, min(1.0, new_arousal))
-
-                return final_valence, final_arousal, sentiment, impact_strength
+                    return orjson.loads(json_match.group(0))
+                except (AttributeError, orjson.JSONDecodeError):
+                    logger.warning("[情绪引擎] 警告: 在LLM的返回中未找到有效的JSON，本轮情绪无变化。")
+                    return None
             else:
-                print(f"[情绪系统] API请求失败，状态码: {response.status_code}")
-                return self.valence, self.arousal, "neutral", 0.0
+                logger.error("[情绪系统] API请求失败，状态码: %s", status_code)
+                return None
         except Exception as e:
-            print(f"[情绪系统] 情绪状态更新过程中发生错误: {e}")
-            return self.valence, self.arousal, "neutral", 0.0
+            logger.error("[情绪系统] 情绪分析请求过程中发生错误: %s", e)
+            return None
 
-    async def process_emotion(self, text: str) -> str:
+    # 核心流程函数
+    async def _update_emotion_state(self, text: str) -> tuple:
 
-        # 状态一：熔断期
-        if self.character_state == EmotionState.MELTDOWN:
-            elapsed_time = (datetime.datetime.now() - self.meltdown_start_time).total_seconds() / 60.0
+        analysis, cache_key = await self.sentiment_cache.get(text)
+        if analysis is None:
+            analysis = await self.sentiment_batcher.submit(text)
+            if analysis is None:
+                return self.valence, self.arousal, "neutral", 0.0
+            self.sentiment_cache.put(cache_key, analysis)
 
-            if self.valence >= -0.3 or elapsed_time >= self.MELTDOWN_DURATION_MINUTES:
-                print(f"[情绪引擎] 爆发期结束。切换到恢复期。")
-                self.character_state = EmotionState.RECOVERING
-                self.meltdown_start_time = datetime.datetime.now()
-            else:
-                x = elapsed_time * self.TIME_SCALING_FACTOR 
-                decay_value = 1000 / (x**2 + 1000)
-                self.arousal = decay_value
-                self.valence = -decay_value
-
-        # 状态二：恢复期
-        elif self.character_state == EmotionState.RECOVERING:
-            initial_valence = -0.3
-            initial_arousal = 0.1
-            elapsed_time = (datetime.datetime.now() - self.meltdown_start_time).total_seconds() / 60.0
-            progress = min(elapsed_time / self.RECOVERY_DURATION_MINUTES, 1.0)
-
-            if progress >= 1.0:
-                self.character_state = EmotionState.NORMAL
-                self.valence = 0.0
-                self.arousal = 0.0
+        try:
+            sentiment = analysis.get("sentiment", "neutral")
+            intensity = float(analysis.get("intensity", 0.0))
+            arousal_impact = float(analysis.get("arousal_impact", 0.0))
+            
+            if sentiment == "neutral":
+                new_valence = self.valence
+                impact_strength = 0.0
             else:
-                self.valence = initial_valence * (1 - progress)
-                self.arousal = initial_arousal * (1 - progress)
+                impact_strength = (intensity / 8.1) ** 1.1
+                potential_delta = impact_strength if sentiment == "positive" else -impact_strength
 
-        # 状态三：正常状态
-        else: # EmotionState.NORMAL
-            new_valence, new_arousal, sentiment, impact_strength = await self._update_emotion_state(text)
+                acceptance_ratio = compute_acceptance_ratio(self.valence, impact_strength)
+                final_delta = potential_delta * acceptance_ratio
+                new_valence = self.valence + final_delta
             
-            self.latent_emotions["frustration"] = self._update_latent_emotions(
-                self.latent_emotions["frustration"], sentiment, impact_strength, self.valence
-            )
+            base_delta_arousal = arousal_impact / 10.0
+
+            permission_factor = compute_arousal_permission_factor(self.arousal)
+            damped_delta_arousal = base_delta_arousal * permission_factor
+            valence_pull = self._compute_valence_pull(new_valence, arousal_impact)
+            new_arousal = self.arousal + damped_delta_arousal + valence_pull
             
-            self.valence = new_valence
-            self.arousal = new_arousal
+            # 条件表达式截断到合法区间，省去min/max的函数调用
+            final_valence = 1.0 if new_valence > 1.0 else (-1.0 if new_valence < -1.0 else new_valence)
+            final_arousal = 1.0 if new_arousal > 1.0 else (0.0 if new_arousal < 0.0 else new_arousal)
 
-            if self.latent_emotions["frustration"] > self.FRUSTRATION_THRESHOLD:
-                print(f"[情绪引擎] 烦躁值超出阈值，触发情绪熔断！")
-                self.character_state = EmotionState.MELTDOWN
-                self.meltdown_start_time = datetime.datetime.now()
-                self.valence = -1.0
-                self.arousal = 1.0
-                self.latent_emotions["frustration"] = 0.0
+            return final_valence, final_arousal, sentiment, impact_strength
+        except Exception as e:
+            logger.error("[情绪系统] 情绪状态更新过程中发生错误: %s", e)
+            return self.valence, self.arousal, "neutral", 0.0
+
+    async def aclose(self):
+        """写入尚未保存的情绪状态，并关闭情绪分析请求的连接池"""
+        if self._save_task is not None:
+            await self._save_task
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+            await asyncio.to_thread(self._save_state)
+        await self.http_client.aclose()
+
+    def _schedule_transition(self):
+        """根据当前状态和起始时间，算出下一次状态切换的时间点"""
+        if self.character_state == EmotionState.NORMAL:
+            self._next_transition_mono = math.inf
+            return
+        if self.meltdown_start_time is None:
+            self.meltdown_start_time = time.monotonic()
+        if self.character_state == EmotionState.MELTDOWN:
+            self._next_transition_mono = self.meltdown_start_time + self._meltdown_exit_s
+        else:
+            self._next_transition_mono = self.meltdown_start_time + self._recovery_dur_s
+
+    def _enter_state(self, state: EmotionState, now: float):
+        self.character_state = state
+        self.meltdown_start_time = now
+        self._schedule_transition()
+
+    def _recompute_state_from_clock(self, now: float) -> tuple:
+        """
+        熔断期和恢复期的情绪只取决于经过的时间，直接按公式求值，不修改实例。
+        返回 (valence, arousal, 状态)，状态与当前不同表示这一刻发生了切换。
+        """
+        initial_valence = -0.3
+        initial_arousal = 0.1
+        if now >= self._next_transition_mono:
+            if self.character_state == EmotionState.MELTDOWN:
+                return initial_valence, initial_arousal, EmotionState.RECOVERING
+            return 0.0, 0.0, EmotionState.NORMAL
 
-        print(f"[情绪引擎] 状态: {self.character_state.value} | V: {self.valence:.2f}, A: {self.arousal:.2f} | Frustration: {self.latent_emotions['frustration']:.2f}")
+        # 状态一：熔断期
+        if self.character_state == EmotionState.MELTDOWN:
+            elapsed_s = now - self.meltdown_start_time
+            decay_value = 1000.0 / (elapsed_s * elapsed_s * self._time_scaling_sq + 1000.0)
+            return -decay_value, decay_value, EmotionState.MELTDOWN
+
+        # 状态二：恢复期，线性回到0
+        remaining = (self._next_transition_mono - now) / self._recovery_dur_s
+        return initial_valence * remaining, initial_arousal * remaining, EmotionState.RECOVERING
+
+    def _advance_non_normal(self) -> bool:
+        """熔断期和恢复期只依赖时钟，同步推进状态，不需要让出事件循环；正常状态时返回False"""
+        if self.character_state == EmotionState.NORMAL:
+            return False
+        now = time.monotonic()
+        self.valence, self.arousal, state = self._recompute_state_from_clock(now)
+        if state != self.character_state:
+            if state == EmotionState.RECOVERING:
+                logger.info("[情绪引擎] 爆发期结束。切换到恢复期。")
+            self._enter_state(state, now)
+        return True
+
+    # 正常状态：请求情绪分析并累积烦躁值，超出阈值时触发熔断
+    async def _tick_normal_state(self, text: str):
+        new_valence, new_arousal, sentiment, impact_strength = await self._update_emotion_state(text)
+        
+        self.latent_emotions["frustration"] = self._update_latent_emotions(
+            self.latent_emotions["frustration"], sentiment, impact_strength, self.valence
+        )
+        
+        self.valence = new_valence
+        self.arousal = new_arousal
+
+        if self.latent_emotions["frustration"] > self.FRUSTRATION_THRESHOLD:
+            logger.info("[情绪引擎] 烦躁值超出阈值，触发情绪熔断！")
+            self._enter_state(EmotionState.MELTDOWN, time.monotonic())
+            self.valence = -1.0
+            self.arousal = 1.0
+            self.latent_emotions["frustration"] = 0.0
+
+    def _finish_turn(self) -> str:
+        logger.debug(
+            "[情绪引擎] 状态: %s | V: %.2f, A: %.2f | Frustration: %.2f",
+            self.character_state.value, self.valence, self.arousal, self.latent_emotions["frustration"],
+        )
 
 
-        self._save_state()
+        self._request_save()
+        return self.current_mood_instruction()
 
+    def current_mood_instruction(self) -> str:
+        """按当前情绪状态生成扮演指令，不触发新一轮情绪分析"""
+        return create_mood_instruction(self.valence, self.arousal)
 
-        return create_mood_instruction(self.valence, self.arousal)
\ No newline at end of file
+    async def process_emotion(self, text: str) -> str:
+        # 熔断期和恢复期同步处理，只有正常状态才会等待LLM
+        if not self._advance_non_normal():
+            await self._tick_normal_state(text)
+        return self._finish_turn()
\ No newline at end of file
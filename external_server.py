@@ -1,28 +1,62 @@
-from fastapi import Query, APIRouter
+from fastapi import Query, APIRouter, Header
 from fastapi.responses import StreamingResponse, Response, RedirectResponse
 from pydantic import BaseModel
 import base64
 import io
 import json
+import orjson
 from pydub import AudioSegment
 import httpx
 import filetype
-import yaml
+from utilss.yaml_util import load_yaml
+from utilss import log as Log
+import logging
 import os
 import urllib.parse
-from bs4 import BeautifulSoup
+import html
 import random
 import re
+import functools
 import math
 import chat_core
 import time
+import asyncio
+from collections import deque
 from emotion_engine import EmotionEngine
 
 router = APIRouter()
 
+# 天气和图片搜索请求共用的连接池，避免每次请求重新建立TCP/TLS连接
+HTTP_CLIENT = httpx.AsyncClient(
+    timeout=httpx.Timeout(65.0, connect=5.0),
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+)
+router.add_event_handler("shutdown", HTTP_CLIENT.aclose)
+
+# 组装一帧SSE数据，与 chat_core 的输出格式一致
+def _sse_frame(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# 流式处理中频繁使用的正则，预先编译
+_TAG_SPLIT_RE = re.compile(r"(\{image:.*?\}|\{meme:.*?\}|\{pics:.*?\})")
+_IMAGE_TAG_RE = re.compile(r"\{image:(.+?)\}")
+_MEME_TAG_RE = re.compile(r"\{meme:(.+?)\}")
+_IMAGE_STRIP_RE = re.compile(r"(\{image:.*?\})")
+_IMG_TAIL_RE = re.compile(r"\{img\}.*?$")
+# 搜索结果页中的图片链接：<a class="iusc" m="{...murl...}">，直接在原始字节上匹配，不构建DOM
+_A_TAG_RE = re.compile(rb"<a\s[^>]*>")
+_IUSC_CLASS_RE = re.compile(rb'\sclass="(?:[^"]*\s)?iusc(?:\s[^"]*)?"')
+_M_ATTR_RE = re.compile(rb'\sm="([^"]*)"')
+# 天气查询的关键词，一次正则扫描代替逐个子串查找
+_WEATHER_TRIGGER_RE = re.compile(r"天气|气温")
+_WEATHER_NOW_RE = re.compile(r"现在|此刻|今天")
+_WEATHER_FUTURE_RE = re.compile(r"未来|将来|下一个")
+_WEATHER_3_RE = re.compile(r"[3三]")
+_WEATHER_7_RE = re.compile(r"[7七]")
+
 # --- 1. 读取配置文件 ---
 with open("config.yaml", "r", encoding="utf-8") as f:
-    config_data = yaml.safe_load(f)
+    config_data = load_yaml(f)
 
 # --- 2. 定义所有全局配置和状态变量 (只在这里定义一次) ---
 agent_config = config_data.get("Agent", {})
@@ -44,6 +78,7 @@ pic_feature_enabled = pics_cfg.get("turn_on", False)
 
 #用于计算输入冲击的函数
 emotion_engine = EmotionEngine(agent_config=agent_config, llm_config=llm_config)
+router.add_event_handler("shutdown", emotion_engine.aclose)
 mood_system_enabled = agent_config.get("mood_system_enabled", True)
 emotion_profile_matrix = agent_config.get("emotion_profile_matrix", [])
 
@@ -51,19 +86,31 @@ emotion_profile_matrix = agent_config.get("emotion_profile_matrix", [])
 
 
 
-conversation_history = []
 CONTEXT_WINDOW_SIZE = 6
+# 短期记忆，超出窗口的旧消息自动丢弃
+conversation_history = deque(maxlen=CONTEXT_WINDOW_SIZE)
 
 # 扫描并打印本地资源状态
 STATIC_FILES_DIR = "F:/Moechatremote_client/static" # 请确保这个路径是正确的
 MEMES_BASE_DIR = os.path.join(STATIC_FILES_DIR, "memes")
 PICS_BASE_DIR = os.path.join(STATIC_FILES_DIR, "pics")
 
+# scandir 的 DirEntry 自带文件类型，不必对每个条目再 stat 一次
+def _scan_dir(path: str, want_dirs: bool = False) -> list:
+    if not os.path.isdir(path):
+        return []
+    with os.scandir(path) as it:
+        return [e.name for e in it if (e.is_dir() if want_dirs else e.is_file())]
+
+# 各表情包主题文件夹的文件列表缓存：关键词 -> (时间戳, 文件名列表)
+_MEME_DIR_CACHE = {}
+_MEME_DIR_TTL = 60
+
 print(f"[功能状态] 天气查询: {'启用' if weather_feature_enabled else '关闭'}")
 print(f"[功能状态] 网络图片搜索: {'启用' if image_feature_enabled else '关闭'}")
 print(f"[功能状态] 本地图片分享: {'启用' if pic_feature_enabled else '关闭'}")
 if pic_feature_enabled:
-    AVAILABLE_PICS = [f for f in os.listdir(PICS_BASE_DIR) if os.path.isfile(os.path.join(PICS_BASE_DIR, f))] if os.path.isdir(PICS_BASE_DIR) else []
+    AVAILABLE_PICS = _scan_dir(PICS_BASE_DIR)
     if not AVAILABLE_PICS:
         print("           └─ [警告] 'pics' 文件夹是空的或不存在。")
     else:
@@ -71,7 +118,7 @@ if pic_feature_enabled:
 
 print(f"[功能状态] 表情包: {'启用' if meme_feature_enabled else '关闭'}")
 if meme_feature_enabled:
-    VALID_MEME_FOLDERS = [d for d in os.listdir(MEMES_BASE_DIR) if os.path.isdir(os.path.join(MEMES_BASE_DIR, d))] if os.path.isdir(MEMES_BASE_DIR) else []
+    VALID_MEME_FOLDERS = _scan_dir(MEMES_BASE_DIR, want_dirs=True)
     if not VALID_MEME_FOLDERS:
         print("           └─ [警告] 'memes' 文件夹内未找到任何主题子文件夹。")
     else:
@@ -79,8 +126,32 @@ if meme_feature_enabled:
 
 print("="*63 + "\n")
 
+# 可用工具说明只取决于功能开关和启动时扫描到的资源，预先拼好，常规对话时直接接在系统提示后面
+def _build_tool_prompt_tail() -> str:
+    tool_instructions = []
+    if image_feature_enabled:
+        tool_instructions.append("【网络图片搜索】: 当用户需要一张具体内容的图片时，你必须严格使用`{image:搜索关键词}`格式来调用。例如：`{image:一只可爱的英国短毛猫}`。")
+    if meme_feature_enabled and VALID_MEME_FOLDERS:
+        meme_keywords_str = ", ".join(VALID_MEME_FOLDERS)
+        tool_instructions.append(f"【发送表情包】: 当你想用表情包表达情绪时，你必须严格使用`{{meme:关键词}}`格式来调用。可用的关键词有: {meme_keywords_str}。")
+    if pic_feature_enabled and AVAILABLE_PICS:
+        tool_instructions.append("【发送本地精美图片】: 当你想主动分享一张美丽的图片时，你必须严格使用`{pics:好看的图片}`这个固定标签。")
+    if not tool_instructions:
+        return ""
+    return (
+        "\n\n---【可用工具说明】---\n"
+        "你拥有以下工具，使用时必须严格遵守格式，不要进行任何形式的创造或修改：\n"
+        + "\n".join(tool_instructions)
+    )
+
+_TOOL_PROMPT_TAIL = _build_tool_prompt_tail()
 
 
+
+# 天气查询结果缓存：(查询类型, 地点) -> (时间戳, 结果)，实况5分钟、预报30分钟内不重复请求
+_WEATHER_CACHE = {}
+_WEATHER_TTL = {"now": 300, "3d": 1800, "7d": 1800}
+
 # 和风天气接口
 async def get_heweather_dynamic(text: str) -> str:
     try:
@@ -89,32 +160,36 @@ async def get_heweather_dynamic(text: str) -> str:
         location_id = heweather_cfg.get("location_id")
         host = heweather_cfg.get("host", "devapi.qweather.com")
 
-        if any(w in text for w in ["现在", "此刻", "今天"]):
+        if _WEATHER_NOW_RE.search(text):
             path, query_type = "now", "now"
-        elif any(w in text for w in ["未来", "将来", "下一个"]) and any(d in text for d in ["3", "三"]):
+        elif _WEATHER_FUTURE_RE.search(text) and _WEATHER_3_RE.search(text):
             path, query_type = "3d", "3d"
-        elif any(w in text for w in ["未来", "将来", "下一个"]) and any(d in text for d in ["7", "七"]):
+        elif _WEATHER_FUTURE_RE.search(text) and _WEATHER_7_RE.search(text):
             path, query_type = "7d", "7d"
         else:
             return "【天气信息】暂无法判断您请求的是哪天的天气，可尝试说“今天天气”、“未来3天天气”或“未来7天天气”。"
 
+        cache_key = (query_type, location_id)
+        entry = _WEATHER_CACHE.get(cache_key)
+        if entry and time.monotonic() - entry[0] < _WEATHER_TTL[query_type]:
+            return entry[1]
+
         url = f"https://{host}/v7/weather/{path}?location={location_id}"
         headers = {"X-QW-API-Key": key}
 
-        async with httpx.AsyncClient(timeout=8.0) as client:
-            res = await client.get(url, headers=headers)
-            data = res.json()
-            
-            print("\n===== [和风天气 API 原始JSON返回] =====")
-            print(json.dumps(data, indent=2, ensure_ascii=False))
-            print("======================================\n")
+        res = await HTTP_CLIENT.get(url, headers=headers, timeout=8.0)
+        data = res.json()
+        
+        # 日志级别为DEBUG时才序列化并输出原始返回
+        if Log.logger.isEnabledFor(logging.DEBUG):
+            Log.logger.debug("[和风天气 API 原始JSON返回]\n%s", json.dumps(data, indent=2, ensure_ascii=False))
 
         if data.get("code") != "200":
             return f"【天气信息】无法获取天气数据，API错误码: {data.get('code')}。"
 
         if query_type == "now" and "now" in data:
             now = data["now"]
-            return f"【天气信息】当前天气：{now.get('text', '')}，气温{now.get('temp', '')}℃，体感温度{now.get('feelsLike', '')}℃，{now.get('windDir', '')}{now.get('windScale', '')}级，相对湿度{now.get('humidity', '')}%，降水量{now.get('precip', '0')}毫米。"
+            result = f"【天气信息】当前天气：{now.get('text', '')}，气温{now.get('temp', '')}℃，体感温度{now.get('feelsLike', '')}℃，{now.get('windDir', '')}{now.get('windScale', '')}级，相对湿度{now.get('humidity', '')}%，降水量{now.get('precip', '0')}毫米。"
         
         elif "daily" in data:
             report_lines = []
@@ -129,39 +204,59 @@ async def get_heweather_dynamic(text: str) -> str:
             
             days_str = "\n".join(report_lines)
             days_count_char = query_type[0]
-            return f"【天气信息】未来{days_count_char}天天气预报如下：\n{days_str}"
+            result = f"【天气信息】未来{days_count_char}天天气预报如下：\n{days_str}"
         else:
             return "【天气信息】未能从API获取到有效的天气详情。"
 
+        _WEATHER_CACHE[cache_key] = (time.monotonic(), result)
+        return result
+
     except Exception as e:
         return f"【天气信息】请求过程中发生内部错误: {e}。"
 
-# 图片搜索 URL 构造器
+# 图片搜索引擎在启动时确定
+_IMG_ENGINE = get_image_cfg.get("engine", "yandex")
+_IMG_BASE_URL = get_image_cfg.get("engines", {}).get(_IMG_ENGINE)
+
+# 图片搜索 URL 构造器，相同关键词直接复用
+@functools.lru_cache(maxsize=1024)
 def build_image_search_url(keyword: str):
-    get_image_cfg = config_data.get("get_image", {})
-    engine = get_image_cfg.get("engine", "yandex")
-    engine_urls = get_image_cfg.get("engines", {})
-    if engine not in engine_urls:
+    if _IMG_BASE_URL is None:
         return None
-    base_url = engine_urls[engine]
-    encoded = urllib.parse.quote(keyword, safe="")
-    return base_url + encoded
+    return _IMG_BASE_URL + urllib.parse.quote(keyword, safe="")
+
+# 启动时预先连上天气和图片搜索的服务器，首次请求不必再等待TCP/TLS握手
+async def _warm_http_pool():
+    urls = []
+    if weather_feature_enabled:
+        urls.append(f"https://{heweather_cfg.get('host', 'devapi.qweather.com')}/")
+    if image_feature_enabled and _IMG_BASE_URL:
+        parts = urllib.parse.urlsplit(_IMG_BASE_URL)
+        urls.append(f"{parts.scheme}://{parts.netloc}/")
+
+    async def warm(url):
+        try:
+            await HTTP_CLIENT.head(url, timeout=2.0)
+        except Exception:
+            pass
 
-@router.get("/img_search")
-async def img_search(q: str = Query(...)):
+    await asyncio.gather(*(warm(url) for url in urls))
+
+router.add_event_handler("startup", _warm_http_pool)
+
+async def _img_search_impl(q: str) -> dict:
     try:
         url = build_image_search_url(q)
         headers = {"User-Agent": "Mozilla/5.0"}
-        async with httpx.AsyncClient(timeout=8.0) as client:
-            resp = await client.get(url, headers=headers)
-        soup = BeautifulSoup(resp.text, "html.parser")
+        resp = await HTTP_CLIENT.get(url, headers=headers, timeout=8.0)
         img_urls = []
-        a_tags = soup.find_all("a", class_="iusc")
-        for a in a_tags:
-            meta = a.get("m")
+        for a_tag in _A_TAG_RE.finditer(resp.content):
+            tag = a_tag.group(0)
+            if not _IUSC_CLASS_RE.search(tag): continue
+            meta = _M_ATTR_RE.search(tag)
             if not meta: continue
             try:
-                data = json.loads(meta)
+                data = orjson.loads(html.unescape(meta.group(1).decode("utf-8")))
                 murl = data.get("murl")
                 if murl and murl.startswith("http"):
                     img_urls.append(murl)
@@ -173,23 +268,34 @@ async def img_search(q: str = Query(...)):
     except Exception as e:
         return {"error": str(e)}
 
+@router.get("/img_search")
+async def img_search(q: str = Query(...)):
+    return await _img_search_impl(q)
+
 class AudioData(BaseModel):
     audio: str
 
+# 解码上传的音频并识别格式，大文件解码较慢，放到线程中执行
+def _decode_upload(audio: str):
+    header, encoded = audio.split(",", 1) if "," in audio else ("", audio)
+    audio_bytes = base64.b64decode(encoded)
+    return audio_bytes, filetype.guess(audio_bytes)
+
+# 转成16k单声道wav，pydub会调用ffmpeg子进程，放到线程中执行，避免阻塞事件循环
+def _transcode_to_wav16k_mono(audio_bytes: bytes, ext: str) -> bytes:
+    audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=ext)
+    audio = audio.set_frame_rate(16000).set_channels(1)
+    buf = io.BytesIO()
+    audio.export(buf, format="wav")
+    return buf.getvalue()
+
 @router.post("/audio")
 async def process_audio(data: AudioData):
     try:
-        header, encoded = data.audio.split(",", 1) if "," in data.audio else ("", data.audio)
-        audio_bytes = base64.b64decode(encoded)
-        kind = filetype.guess(audio_bytes)
+        audio_bytes, kind = await asyncio.to_thread(_decode_upload, data.audio)
         if kind is None: return {"error": "无法识别的音频格式"}
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=kind.extension)
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        buf = io.BytesIO()
-        audio.export(buf, format="wav")
-        buf.seek(0)
-        audio_b64 = base64.urlsafe_b64encode(buf.read()).decode("utf-8")
-        text = chat_core.asr(audio_b64)
+        wav_bytes = await asyncio.to_thread(_transcode_to_wav16k_mono, audio_bytes, kind.extension)
+        text = await chat_core.asr_bytes_async(wav_bytes)
         user_text = text.strip()
         if not user_text: return {"error": "ASR未返回有效文本"}
         return {"text": user_text}
@@ -198,28 +304,26 @@ async def process_audio(data: AudioData):
 
 # 图片处理函数
 async def process_image_tag(tag: str):
-    keyword = re.findall(r"\{image:(.+?)\}", tag)
+    keyword = _IMAGE_TAG_RE.findall(tag)
     if not keyword: return
     kw = keyword[0].strip()
     kw_for_search = kw.replace(" ", "")
     if not kw_for_search: return
     print(f"[图片请求]：'{kw}' (搜索使用: '{kw_for_search}')")
-    img_url = f"http://127.0.0.1:8001/web/img_search?q={urllib.parse.quote(kw_for_search)}"
     try:
-        async with httpx.AsyncClient(timeout=8.0) as client:
-            res = await client.get(img_url)
-        data = res.json()
+        # 同进程内直接调用，不再绕一圈本机HTTP请求
+        data = await _img_search_impl(kw_for_search)
         if "images" in data and data["images"]:
             selected_image = random.choice(data['images'])
-            yield f"data: {json.dumps({'file': None, 'message': f'{{img}}{selected_image}', 'done': False})}\n\n"
+            yield _sse_frame({'file': None, 'message': f'{{img}}{selected_image}', 'done': False})
         else:
-            yield f"data: {json.dumps({'file': None, 'message': f'[系统提示] 未找到关于“{kw}”的图片', 'done': False})}\n\n"
+            yield _sse_frame({'file': None, 'message': f'[系统提示] 未找到关于“{kw}”的图片', 'done': False})
     except Exception as e:
-        yield f"data: {json.dumps({'file': None, 'message': f'[系统提示] 搜索“{kw}”的图片时接口错误', 'done': False})}\n\n"
+        yield _sse_frame({'file': None, 'message': f'[系统提示] 搜索“{kw}”的图片时接口错误', 'done': False})
 
 # 表情包处理函数
 async def process_meme_tag(tag: str):
-    keyword = re.findall(r"\{meme:(.+?)\}", tag)
+    keyword = _MEME_TAG_RE.findall(tag)
     if not keyword: return
     kw = keyword[0].strip()
     
@@ -228,8 +332,11 @@ async def process_meme_tag(tag: str):
         return
         
     try:
-        meme_folder_path = os.path.join(MEMES_BASE_DIR, kw)
-        meme_files = [f for f in os.listdir(meme_folder_path) if os.path.isfile(os.path.join(meme_folder_path, f))]
+        entry = _MEME_DIR_CACHE.get(kw)
+        if entry is None or time.monotonic() - entry[0] > _MEME_DIR_TTL:
+            entry = (time.monotonic(), _scan_dir(os.path.join(MEMES_BASE_DIR, kw)))
+            _MEME_DIR_CACHE[kw] = entry
+        meme_files = entry[1]
         if not meme_files:
             print(f"[表情包功能] 警告：表情包文件夹 '{kw}' 是空的。")
             return
@@ -237,7 +344,7 @@ async def process_meme_tag(tag: str):
         random_meme = random.choice(meme_files)
         meme_url = f"/static/memes/{kw}/{random_meme}"
         print(f"[表情包功能] 发送表情包：{meme_url}")
-        yield f"data: {json.dumps({'file': None, 'message': f'{{img}}{meme_url}', 'done': False})}\n\n"
+        yield _sse_frame({'file': None, 'message': f'{{img}}{meme_url}', 'done': False})
 
     except Exception as e:
         print(f"[表情包功能] 处理表情包 '{kw}' 时发生错误: {e}")
@@ -251,22 +358,42 @@ async def send_random_pic():
         random_pic_filename = random.choice(AVAILABLE_PICS)
         pic_url = f"/static/pics/{random_pic_filename}"
         print(f"[本地图片功能] 发送图片：{pic_url}")
-        yield f"data: {json.dumps({'file': None, 'message': f'{{img}}{pic_url}', 'done': False})}\n\n"
+        yield _sse_frame({'file': None, 'message': f'{{img}}{pic_url}', 'done': False})
     except Exception as e:
         print(f"[本地图片功能] 处理随机图片时发生错误: {e}")
 
-# LLM流式响应处理器
-async def process_llm_stream(response, image_feature_enabled, meme_feature_enabled, pic_feature_enabled):
-    async for line in response.aiter_lines():
+# 在进程内直接调用 chat_core 的对话流（即 /api/chat 的实现），按行拆开SSE帧
+async def _local_chat_lines(chat_data: dict):
+    stream = chat_core.text_llm_tts(chat_core.tts_data(msg=chat_data["msg"]), time.time())
+    try:
+        async for frame in stream:
+            if isinstance(frame, bytes):
+                frame = frame.decode("utf-8")
+            for line in frame.split("\n"):
+                yield line
+    finally:
+        await stream.aclose()
+
+# LLM流式响应处理器，产出 (SSE帧, 文字内容)，工具产生的帧和无法解析的行文字内容为None
+async def process_llm_stream(lines, image_feature_enabled, meme_feature_enabled, pic_feature_enabled):
+    any_feature_enabled = image_feature_enabled or meme_feature_enabled or pic_feature_enabled
+    async for line in lines:
         if not (line and line.startswith("data:")): continue
-        content_str = line[len("data:"):].strip()
         try:
-            llm_data = json.loads(content_str)
+            # JSON允许首尾空白，orjson可以直接解析，不必先strip
+            llm_data = orjson.loads(line[5:])
             if llm_data.get("done"): break
             message_chunk = llm_data.get("message", "")
+            audio_file = llm_data.get("file")
+
+            # 大多数分段不含标签，不需要正则拆分，整段原样发送
+            if not any_feature_enabled or "{" not in message_chunk:
+                if message_chunk:
+                    yield _sse_frame({'file': audio_file, 'message': message_chunk, 'done': False}), message_chunk
+                continue
             
             # ===== 修正：将正则表达式中的 pic 改为 pics =====
-            sub_segments = re.split(r"(\{image:.*?\}|\{meme:.*?\}|\{pics:.*?\})", message_chunk)
+            sub_segments = _TAG_SPLIT_RE.split(message_chunk)
             
             audio_has_been_sent = False
             
@@ -274,24 +401,18 @@ async def process_llm_stream(response, image_feature_enabled, meme_feature_enabl
                 if not sub_seg: continue
                 
                 if image_feature_enabled and sub_seg.startswith("{image:"):
-                    async for item in process_image_tag(sub_seg): yield item
+                    async for item in process_image_tag(sub_seg): yield item, None
                 elif meme_feature_enabled and sub_seg.startswith("{meme:"):
-                    async for item in process_meme_tag(sub_seg): yield item
+                    async for item in process_meme_tag(sub_seg): yield item, None
                 elif pic_feature_enabled and sub_seg.startswith("{pics:"):
-                    async for item in send_random_pic(): yield item
+                    async for item in send_random_pic(): yield item, None
                 else:
-                    current_payload = llm_data.copy()
-                    current_payload['message'] = sub_seg
-                    
-                    if not audio_has_been_sent:
-                        audio_has_been_sent = True
-                    else:
-                        current_payload['file'] = None
+                    # 音频只随第一段文字发送，之后的分段不再携带
+                    yield _sse_frame({'file': None if audio_has_been_sent else audio_file, 'message': sub_seg, 'done': False}), sub_seg
+                    audio_has_been_sent = True
 
-                    yield f"data: {json.dumps(current_payload)}\n\n"
-
-        except json.JSONDecodeError:
-            yield line + "\n\n"
+        except orjson.JSONDecodeError:
+            yield (line + "\n\n").encode("utf-8"), None
 
 
 
@@ -300,7 +421,10 @@ async def process_llm_stream(response, image_feature_enabled, meme_feature_enabl
 async def stream_chat(text: str = Query(...)):
     async def audio_stream():
         
-        mood_instruction = await emotion_engine.process_emotion(text)
+        # 情绪分析和对话请求并行：本轮回复使用上一轮结束时的情绪，
+        # 本条消息带来的情绪变化在下一轮才体现，情绪分析不再拖慢首字延迟
+        mood_instruction = emotion_engine.current_mood_instruction()
+        mood_task = asyncio.create_task(emotion_engine.process_emotion(text))
 
         
         # --- 读取所有功能开关 ---
@@ -333,7 +457,7 @@ async def stream_chat(text: str = Query(...)):
                     chat_data = {"msg": [{"role": "system", "content": final_prompt}]}
 
             # --- 分支二: 天气功能处理 (第二优先级) ---
-            elif weather_feature_enabled and any(kw in text for kw in ["天气", "气温"]):
+            elif weather_feature_enabled and _WEATHER_TRIGGER_RE.search(text):
                 print("[天气功能触发]")
                 weather_data_string = await get_heweather_dynamic(text)
                 weather_system_prompt = "你是一个生活助手，也是一个天气播报员..." # 省略完整prompt
@@ -346,28 +470,11 @@ async def stream_chat(text: str = Query(...)):
             else:
                 # 独立处理图片标签，不影响主对话流程
                 async for item in process_image_tag(text): yield item
-                processed_text_for_llm = re.sub(r"(\{image:.*?\})", "", text).strip()
+                processed_text_for_llm = _IMAGE_STRIP_RE.sub("", text).strip()
                 
                 if processed_text_for_llm:
-                    # 第一部分: 角色与情绪指令
-                    system_prompt = "你是一个AI助手。"
-                    if mood_system_enabled:
-                        system_prompt += mood_instruction
-
-                    # 第二部分: 可用工具指令
-                    tool_instructions = []
-                    if image_feature_enabled:
-                        tool_instructions.append("【网络图片搜索】: 当用户需要一张具体内容的图片时，你必须严格使用`{image:搜索关键词}`格式来调用。例如：`{image:一只可爱的英国短毛猫}`。")
-                    if meme_feature_enabled and VALID_MEME_FOLDERS:
-                        meme_keywords_str = ", ".join(VALID_MEME_FOLDERS)
-                        tool_instructions.append(f"【发送表情包】: 当你想用表情包表达情绪时，你必须严格使用`{{meme:关键词}}`格式来调用。可用的关键词有: {meme_keywords_str}。")
-                    if pic_feature_enabled and AVAILABLE_PICS:
-                        tool_instructions.append("【发送本地精美图片】: 当你想主动分享一张美丽的图片时，你必须严格使用`{pics:好看的图片}`这个固定标签。")
-                    
-                    if tool_instructions:
-                        system_prompt += "\n\n---【可用工具说明】---\n"
-                        system_prompt += "你拥有以下工具，使用时必须严格遵守格式，不要进行任何形式的创造或修改：\n"
-                        system_prompt += "\n".join(tool_instructions)
+                    # 角色与情绪指令，加上预先拼好的可用工具说明
+                    system_prompt = "你是一个AI助手。" + (mood_instruction if mood_system_enabled else "") + _TOOL_PROMPT_TAIL
                     
                     chat_data = {"msg": [{"role": "system", "content": system_prompt}, {"role": "user", "content": processed_text_for_llm}]}
 
@@ -375,37 +482,43 @@ async def stream_chat(text: str = Query(...)):
             # 只有在前面的某个分支成功创建了chat_data后，才执行API调用
             if chat_data:
                 
-                async with httpx.AsyncClient(timeout=65.0) as client:
-                    async with client.stream("POST", "http://127.0.0.1:8001/api/chat", json=chat_data) as response:
-                        async for chunk in process_llm_stream(response, image_feature_enabled, meme_feature_enabled, pic_feature_enabled):
-                            yield chunk
-                            # 累积回复
-                            try:
-                                data_str = chunk.decode('utf-8')
-                                if data_str.startswith("data:"):
-                                    json_data = json.loads(data_str[len("data:"):].strip())
-                                    message_piece = json_data.get("message", "")
-                                    if message_piece and message_piece != '[结束]':
-                                        ai_full_response += message_piece
-                            except: continue
+                lines = _local_chat_lines(chat_data)
+                try:
+                    async for chunk, message_piece in process_llm_stream(lines, image_feature_enabled, meme_feature_enabled, pic_feature_enabled):
+                        yield chunk
+                        # 累积回复，直接使用处理器给出的文字，不再重新解析帧
+                        if message_piece and message_piece != '[结束]':
+                            ai_full_response += message_piece
+                finally:
+                    await lines.aclose()
         
         except Exception as e:
             print(f"[错误] 对话流处理失败：", e)
         finally:
             if ai_full_response:
-                ai_full_response_cleaned = re.sub(r"\{img\}.*?$", "", ai_full_response).strip()
+                ai_full_response_cleaned = _IMG_TAIL_RE.sub("", ai_full_response).strip()
                 conversation_history.append({"role": "user", "content": text})
                 conversation_history.append({"role": "assistant", "content": ai_full_response_cleaned})
-                conversation_history = conversation_history[-CONTEXT_WINDOW_SIZE:]
                 print(f"[短期记忆] 更新完成，当前包含 {len(conversation_history)} 条消息。")
-            yield f"data: {json.dumps({'file': None, 'message': '[结束]', 'done': True})}\n\n"
+            yield _sse_frame({'file': None, 'message': '[结束]', 'done': True})
+            await mood_task
 
     return StreamingResponse(audio_stream(), media_type="text/event-stream")
 
+# 网页客户端运行期间不会变化，启动时读入内存，按文件修改时间生成ETag
+_CLIENT_HTML_PATH = "./web/moechat_iphone_client.html"
+with open(_CLIENT_HTML_PATH, "rb") as f:
+    _CLIENT_HTML = f.read()
+_CLIENT_HTML_STAT = os.stat(_CLIENT_HTML_PATH)
+_CLIENT_HTML_ETAG = f'"{_CLIENT_HTML_STAT.st_mtime_ns:x}-{_CLIENT_HTML_STAT.st_size:x}"'
+_CLIENT_HTML_HEADERS = {"Cache-Control": "public, max-age=300", "ETag": _CLIENT_HTML_ETAG}
+
 @router.get("/moechat_iphone_client.html")
-def serve_html():
-    with open("./web/moechat_iphone_client.html", "r", encoding="utf-8") as f:
-        return Response(content=f.read(), media_type="text/html")
+def serve_html(if_none_match: str = Header(None)):
+    # 浏览器缓存仍然有效时只回304，不再发送页面内容
+    if if_none_match == _CLIENT_HTML_ETAG:
+        return Response(status_code=304, headers=_CLIENT_HTML_HEADERS)
+    return Response(content=_CLIENT_HTML, media_type="text/html", headers=_CLIENT_HTML_HEADERS)
 
 @router.get("/")
 def redirect_to_html():
@@ -24,6 +24,7 @@ class FinancialAPIClient:
         self.timeout = api_config.get('timeout', 10)
         self.retry_count = api_config.get('retry_count', 3)
         self.retry_delay = 1  # 重试延迟秒数
+        self.session = requests.Session()  # 复用与财务服务的长连接
         
         # 设置日志
         self.logger = logging.getLogger(f"{__name__}.FinancialAPIClient")
@@ -142,7 +143,7 @@ class FinancialAPIClient:
             bool: 服务是否正常
         """
         try:
-            response = requests.get(f"{self.base_url}/api/balances", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/balances", timeout=5)
             return response.status_code == 200
         except Exception as e:
             self.logger.warning(f"财务API健康检查失败: {e}")
@@ -171,14 +172,14 @@ class FinancialAPIClient:
                 
                 # 发起请求
                 if method.upper() == 'POST':
-                    response = requests.post(
+                    response = self.session.post(
                         url, 
                         json=json_data, 
                         timeout=self.timeout,
                         headers={'Content-Type': 'application/json'}
                     )
                 else:  # GET
-                    response = requests.get(
+                    response = self.session.get(
                         url, 
                         params=params, 
                         timeout=self.timeout
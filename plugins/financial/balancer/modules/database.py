@@ -1,6 +1,8 @@
 import sqlite3
 import json
 import os
+import atexit
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from contextlib import contextmanager
@@ -8,10 +10,15 @@ from contextlib import contextmanager
 class DatabaseManager:
     def __init__(self, db_path: str = "data/transactions.db"):
         self.db_path = db_path
+        # Flask多线程模式下每个请求都在新线程中处理，所有线程共用一个连接，用锁串行访问
+        self._conn = None
+        self._lock = threading.RLock()
         self.config_path = "config"
         self.accounts_config = self._load_config("accounts.json")
+        self._account_types = self._build_account_types(self.accounts_config)
         self._ensure_database_exists()
         self._init_tables()
+        atexit.register(self.close)
 
     def _load_config(self, filename: str) -> dict:
         """加载配置文件"""
@@ -33,16 +40,27 @@ class DatabaseManager:
         
     @contextmanager
     def _get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
-        try:
-            yield conn
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+        """
+        获取数据库连接的上下文管理器
+        连接在所有线程间共享并长期保持，持有锁期间独占使用，不再每次操作都重新打开数据库文件
+        """
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
+            conn = self._conn
+            try:
+                yield conn
+            except Exception as e:
+                conn.rollback()
+                raise e
+
+    def close(self):
+        """关闭共享的数据库连接，进程退出时自动调用"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
     
     def _init_tables(self):
         """初始化数据库表"""
@@ -90,7 +108,9 @@ class DatabaseManager:
             ''')
             
             # 创建索引以提高查询性能
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date DESC)')
+            # 与搜索的排序一致，ORDER BY ... LIMIT 可以直接沿索引读取前N条，不必整表排序；也覆盖按日期范围的查询
+            cursor.execute('DROP INDEX IF EXISTS idx_transactions_date')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date_created ON transactions(date DESC, created_at DESC)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_entries_account ON entries(account_name)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_entries_transaction ON entries(transaction_id)')
             
@@ -140,27 +160,26 @@ class DatabaseManager:
                 
                 transaction_id = cursor.lastrowid
                 
-                # 插入借方分录
+                # 批量插入借方和贷方分录
+                amount = transaction_data['amount']
                 debit_account = transaction_data['debit_account']
                 debit_type = self._get_account_type(debit_account)
-                cursor.execute('''
-                    INSERT INTO entries 
-                    (transaction_id, account_name, account_type, debit_amount, credit_amount, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (transaction_id, debit_account, debit_type, transaction_data['amount'], 0, current_time))
-                
-                # 插入贷方分录
                 credit_account = transaction_data['credit_account']
                 credit_type = self._get_account_type(credit_account)
-                cursor.execute('''
+                cursor.executemany('''
                     INSERT INTO entries 
-                    (transaction_id, account_name, account_type, credit_amount, debit_amount, created_at)
+                    (transaction_id, account_name, account_type, debit_amount, credit_amount, created_at)
                     VALUES (?, ?, ?, ?, ?, ?)
-                ''', (transaction_id, credit_account, credit_type, transaction_data['amount'], 0, current_time))
+                ''', [
+                    (transaction_id, debit_account, debit_type, amount, 0, current_time),
+                    (transaction_id, credit_account, credit_type, 0, amount, current_time),
+                ])
                 
                 # 更新账户余额
-                self._update_account_balance(cursor, debit_account, debit_type, transaction_data['amount'], True)
-                self._update_account_balance(cursor, credit_account, credit_type, transaction_data['amount'], False)
+                self._update_account_balances(cursor, [
+                    (debit_account, debit_type, amount, True),
+                    (credit_account, credit_type, amount, False),
+                ])
                 
                 conn.commit()
                 return transaction_id
@@ -169,30 +188,26 @@ class DatabaseManager:
                 conn.rollback()
                 raise Exception(f"保存交易失败: {str(e)}")
     
+    @staticmethod
+    def _build_account_types(accounts_config: dict) -> Dict[str, str]:
+        """把配置文件中的账户分组展开成 账户名称 -> 账户类型 的映射，只在初始化时计算一次"""
+        all_accounts = accounts_config or {}
+        account_types = {}
+        # 按负债、资产、收入、费用的顺序查找，同名账户以先出现的类型为准
+        for group, account_type in (("liability_accounts", "liability"),
+                                    ("asset_accounts", "asset"),
+                                    ("revenue_accounts", "revenue"),
+                                    ("expense_accounts", "expense")):
+            for account_name in all_accounts.get(group, {}):
+                account_types.setdefault(account_name, account_type)
+        return account_types
+
     def _get_account_type(self, account_name: str) -> str:
         """根据账户名称推断账户类型"""
         # 从配置文件中查找账户类型
-        all_accounts = self.accounts_config or {}
-        
-        # 查找负债账户
-        liability_accounts = all_accounts.get("liability_accounts", {})
-        if account_name in liability_accounts:
-            return "liability"
-        
-        # 查找资产账户
-        asset_accounts = all_accounts.get("asset_accounts", {})
-        if account_name in asset_accounts:
-            return "asset"
-        
-        # 查找收入账户
-        revenue_accounts = all_accounts.get("revenue_accounts", {})
-        if account_name in revenue_accounts:
-            return "revenue"
-        
-        # 查找费用账户  
-        expense_accounts = all_accounts.get("expense_accounts", {})
-        if account_name in expense_accounts:
-            return "expense"
+        account_type = self._account_types.get(account_name)
+        if account_type is not None:
+            return account_type
         
         # 默认推断（保持原逻辑作为兜底）
         if "费用" in account_name or "支出" in account_name:
@@ -208,36 +223,32 @@ class DatabaseManager:
     
     def _update_account_balance(self, cursor, account_name: str, account_type: str, amount: float, is_debit: bool):
         """更新账户余额"""
-        current_time = datetime.now().isoformat()
-        
-        # 获取当前余额
-        cursor.execute('SELECT balance FROM account_balances WHERE account_name = ?', (account_name,))
-        result = cursor.fetchone()
+        self._update_account_balances(cursor, [(account_name, account_type, amount, is_debit)])
+    
+    def _update_account_balances(self, cursor, changes: List[Tuple[str, str, float, bool]]):
+        """
+        批量更新账户余额，账户不存在时自动创建
         
-        if result:
-            current_balance = result[0]
-        else:
-            current_balance = 0
-            # 插入新账户
-            cursor.execute('''
-                INSERT INTO account_balances (account_name, account_type, balance, last_updated)
-                VALUES (?, ?, ?, ?)
-            ''', (account_name, account_type, 0, current_time))
+        Args:
+            changes: [(账户名称, 账户类型, 金额, 是否借方), ...]
+        """
+        current_time = datetime.now().isoformat()
         
-        # 计算新余额
+        # 计算余额变动
         # 资产和费用类账户：借方增加，贷方减少
         # 负债、权益和收入类账户：借方减少，贷方增加
-        if account_type in ['asset', 'expense']:
-            new_balance = current_balance + amount if is_debit else current_balance - amount
-        else:  # liability, equity, revenue
-            new_balance = current_balance - amount if is_debit else current_balance + amount
+        rows = []
+        for account_name, account_type, amount, is_debit in changes:
+            increase = is_debit if account_type in ['asset', 'expense'] else not is_debit
+            rows.append((account_name, account_type, amount if increase else -amount, current_time))
         
-        # 更新余额
-        cursor.execute('''
-            UPDATE account_balances 
-            SET balance = ?, last_updated = ?
-            WHERE account_name = ?
-        ''', (new_balance, current_time, account_name))
+        cursor.executemany('''
+            INSERT INTO account_balances (account_name, account_type, balance, last_updated)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(account_name) DO UPDATE SET
+                balance = balance + excluded.balance,
+                last_updated = excluded.last_updated
+        ''', rows)
     
     def get_account_balance(self, account_name: str) -> Optional[float]:
         """获取账户余额"""
@@ -256,7 +267,7 @@ class DatabaseManager:
                 FROM account_balances 
                 ORDER BY account_type, account_name
             ''')
-            return [dict(row) for row in cursor.fetchall()]
+            return [dict(row) for row in cursor]
     
     def search_transactions(self, 
                           start_date: str = None,
@@ -319,40 +330,40 @@ class DatabaseManager:
                 if conditions:
                     query += " WHERE " + " AND ".join(conditions)
             
-            query += f" ORDER BY t.date DESC, t.created_at DESC LIMIT {limit}"
+            # limit 也作为参数传入，不拼接进SQL文本
+            query += " ORDER BY t.date DESC, t.created_at DESC LIMIT ?"
+            params.append(limit)
             
             cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+            return [dict(row) for row in cursor]
     
     def get_monthly_summary(self, year: int, month: int) -> Dict:
         """获取月度汇总"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            date_filter = f"{year:04d}-{month:02d}"
-            
-            # 总收入
-            cursor.execute('''
-                SELECT SUM(total_amount) FROM transactions 
-                WHERE action = 'income' AND date LIKE ?
-            ''', (f"{date_filter}%",))
-            total_income = cursor.fetchone()[0] or 0
+            # 按日期范围过滤，可以走date索引
+            start_date = f"{year:04d}-{month:02d}-01"
+            next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+            end_date = f"{next_year:04d}-{next_month:02d}-01"
             
-            # 总支出
+            # 一次查询按收支类型和分类汇总，总收入/总支出由分组结果累加
             cursor.execute('''
-                SELECT SUM(total_amount) FROM transactions 
-                WHERE action = 'expense' AND date LIKE ?
-            ''', (f"{date_filter}%",))
-            total_expense = cursor.fetchone()[0] or 0
-            
-            # 按分类统计支出
-            cursor.execute('''
-                SELECT category, SUM(total_amount) FROM transactions 
-                WHERE action = 'expense' AND date LIKE ?
-                GROUP BY category
+                SELECT action, category, SUM(total_amount) FROM transactions 
+                WHERE action IN ('income', 'expense') AND date >= ? AND date < ?
+                GROUP BY action, category
                 ORDER BY SUM(total_amount) DESC
-            ''', (f"{date_filter}%",))
-            expense_by_category = dict(cursor.fetchall())
+            ''', (start_date, end_date))
+            
+            total_income = 0
+            total_expense = 0
+            expense_by_category = {}
+            for action, category, amount in cursor:
+                if action == 'income':
+                    total_income += amount
+                else:
+                    total_expense += amount
+                    expense_by_category[category] = amount
             
             return {
                 'year': year,
@@ -377,6 +388,7 @@ class DatabaseManager:
                 entries = cursor.fetchall()
                 
                 # 回滚账户余额
+                changes = []
                 for entry in entries:
                     account_name = entry[0]
                     account_type = entry[1]
@@ -384,9 +396,10 @@ class DatabaseManager:
                     credit_amount = entry[3]
                     
                     if debit_amount > 0:
-                        self._update_account_balance(cursor, account_name, account_type, debit_amount, False)
+                        changes.append((account_name, account_type, debit_amount, False))
                     if credit_amount > 0:
-                        self._update_account_balance(cursor, account_name, account_type, credit_amount, True)
+                        changes.append((account_name, account_type, credit_amount, True))
+                self._update_account_balances(cursor, changes)
                 
                 # 删除交易记录（级联删除entries）
                 cursor.execute('DELETE FROM transactions WHERE id = ?', (transaction_id,))
@@ -403,21 +416,26 @@ class DatabaseManager:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            # 重新计算所有账户余额
+            # 重新计算所有账户余额，同一次查询按主键连接取出当前存储的余额
             cursor.execute('''
-                SELECT account_name, account_type,
-                       SUM(debit_amount) as total_debit,
-                       SUM(credit_amount) as total_credit
-                FROM entries 
-                GROUP BY account_name, account_type
+                SELECT e.account_name, e.account_type,
+                       SUM(e.debit_amount) as total_debit,
+                       SUM(e.credit_amount) as total_credit,
+                       b.balance as stored_balance
+                FROM entries e
+                LEFT JOIN account_balances b ON b.account_name = e.account_name
+                GROUP BY e.account_name, e.account_type
             ''')
             
             calculated_balances = {}
-            for row in cursor.fetchall():
+            stored_balances = {}
+            for row in cursor:
                 account_name = row[0]
                 account_type = row[1]
                 total_debit = row[2] or 0
                 total_credit = row[3] or 0
+                if row[4] is not None:
+                    stored_balances[account_name] = row[4]
                 
                 # 计算正确的余额
                 if account_type in ['asset', 'expense']:
@@ -427,10 +445,6 @@ class DatabaseManager:
                 
                 calculated_balances[account_name] = balance
             
-            # 获取当前存储的余额
-            cursor.execute('SELECT account_name, balance FROM account_balances')
-            stored_balances = dict(cursor.fetchall())
-            
             # 比较差异
             discrepancies = {}
             for account_name, calculated in calculated_balances.items():
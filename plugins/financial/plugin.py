@@ -3,12 +3,13 @@ Financial Plugin Main Logic
 财务插件主逻辑模块
 """
 import json
-import yaml
 import os
 import logging
 from typing import Dict, Optional, Any
 from datetime import datetime
 
+from utilss.yaml_util import load_yaml
+
 from .api_client import FinancialAPIClient
 from .state_manager import SessionStateManager
 
@@ -49,7 +50,7 @@ class FinancialPlugin:
         try:
             if os.path.exists(self.config_path):
                 with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config_data = yaml.safe_load(f)
+                    config_data = load_yaml(f)
                     self.config = config_data.get('financial_plugin', {})
                     self.enabled = self.config.get('enabled', False)
                     
@@ -1,10 +1,24 @@
-from . import sv
-from . import agent
-from . import embedding
-from . import long_mem
-from . import data_base
-from . import prompt
-from . import core_mem
-from . import config
-from . import socket_asr
-from . import log
\ No newline at end of file
+# 子模块按需导入：sv、agent、embedding等会在导入时加载模型，
+# 不应因为只用到config、log、micro_batcher这类轻量模块而被一并加载
+import importlib
+
+__all__ = [
+    "sv",
+    "agent",
+    "embedding",
+    "long_mem",
+    "data_base",
+    "prompt",
+    "core_mem",
+    "config",
+    "socket_asr",
+    "log",
+    "yaml_util",
+    "micro_batcher",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,11 @@
 # 角色模板
 
 import os
-from utilss import long_mem, data_base, prompt, core_mem, log as Log
+from utilss import long_mem, data_base, prompt, core_mem, embedding, log as Log
 from utilss import config as CConfig
 import time
 from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
 import jionlp
 import ast
@@ -12,9 +13,16 @@ import ast
 # from ruamel.yaml.scalarstring import PreservedScalarString
 import re
 import json
-import yaml
+import orjson
+from utilss.yaml_util import load_yaml
 from ruamel.yaml import YAML
 
+# 提取核心记忆时请求大模型共用的会话，保持长连接
+LLM_SESSION = requests.Session()
+
+# 世界书、长期记忆、核心记忆三路检索共用的线程池，避免每轮对话新建线程
+RETRIEVAL_POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="agent_retrieval")
+
 class Agent:
     def update_config(self):
         # 载入配置
@@ -97,7 +105,7 @@ class Agent:
         self.msg_data_tmp = []
         try:
             with open(f"./data/agents/{self.char}/history.yaml", "r", encoding="utf-8") as f:
-                msg_list = yaml.safe_load(f)
+                msg_list = load_yaml(f)
                 self.msg_data = msg_list[-CConfig.config["Agent"]["context_length"]:]
                 Log.logger.info(f"当前上下文长度：{len(msg_list)}")
         except:
@@ -157,9 +165,9 @@ class Agent:
         self.DataBase = data_base.DataBase()
 
     # 知识库内容检索
-    def get_data(self, msg: str, res_msg: list) -> str:
-        msg_list = jionlp.split_sentence(msg, criterion='fine')
-        res_ = self.DataBase.search(msg_list)
+    def get_data(self, msg: str, res_msg: list, vect=None) -> str:
+        msg_list = jionlp.split_sentence(msg, criterion='fine') if vect is None else None
+        res_ = self.DataBase.search(msg_list, vect)
         if res_ != "":
             res_msg.append(res_)
 
@@ -182,8 +190,8 @@ class Agent:
             ]
         }
         try:
-            res = requests.post(self.llm_config["api"], json=data, headers=headers, timeout=15)
-            res_msg = res.json()["choices"][0]["message"]["content"]
+            res = LLM_SESSION.post(self.llm_config["api"], data=orjson.dumps(data), headers=headers, timeout=15)
+            res_msg = orjson.loads(res.content)["choices"][0]["message"]["content"]
             mem_list = ast.literal_eval(jionlp.extract_parentheses(res_msg, "[]")[0].replace(" ", "").replace("\n", ""))
             if len(mem_list) > 0:
                 self.Core_mem.add_memory(mem_list)
@@ -209,30 +217,38 @@ class Agent:
         core_mem = []
         res_msg += self.prompt
 
+        # 世界书的分句和记忆检索用的整句一次批量向量化，不再各自调用一次模型
+        data_base_vect = None
+        msg_vect = None
+        if self.is_data_base or self.is_core_mem:
+            texts = jionlp.split_sentence(msg, criterion='fine') if self.is_data_base else []
+            n = len(texts)
+            if self.is_core_mem:
+                texts.append(msg)
+            if texts:
+                vects = embedding.t2vect(texts)
+                if self.is_data_base and n:
+                    data_base_vect = vects[:n]
+                if self.is_core_mem:
+                    msg_vect = vects[n:]
+
         # 检索世界书
         if self.is_data_base:
-            tt = Thread(target=self.get_data, args=(msg, data_base, ))
-            tt.daemon = True
-            t_list.append(tt)
-            tt.start()
+            t_list.append(RETRIEVAL_POOL.submit(self.get_data, msg, data_base, data_base_vect))
 
         # 搜索记忆
         if self.is_long_mem:
-            tt = Thread(target=self.Memorys.get_memorys, args=(msg, mem_msg, t_n))
-            tt.daemon = True
-            t_list.append(tt)
-            tt.start()
+            t_list.append(RETRIEVAL_POOL.submit(self.Memorys.get_memorys, msg, mem_msg, t_n, msg_vect))
 
         # 搜索核心记忆
         if self.is_core_mem:
-            tt = Thread(target=self.Core_mem.find_mem, args=(msg, core_mem, ))
-            tt.daemon = True
-            t_list.append(tt)
-            tt.start()
+            t_list.append(RETRIEVAL_POOL.submit(self.Core_mem.find_mem, msg, core_mem, msg_vect))
 
-        # 等待查询结果
+        # 等待查询结果，单路检索出错不影响其他结果
+        wait(t_list)
         for tt in t_list:
-            tt.join()
+            if tt.exception() is not None:
+                Log.logger.error(f"检索上下文失败：{tt.exception()}")
         
         # 合并上下文、世界书、记忆信息
         tmp_msg = ''''''
@@ -130,6 +130,9 @@ Agent:
     使用口语的文字风格进行对话，不要太啰嗦。'''
 
 
+# 配置版本号，每次更新配置后加一，供缓存了配置派生数据的模块判断是否需要重建
+version = 0
+
 # 读取配置文件
 yaml = YAML()
 yaml.preserve_quotes = True
@@ -174,6 +177,7 @@ def recursive_update(parent, key_or_index, original, new):
 # 完整更新流程
 def update_config(client_json):
     global config
+    global version
     # 处理根节点（根节点的父对象设为None，用特殊方式处理）
     if isinstance(config, CommentedMap) and isinstance(client_json, dict):
         for key, value in client_json.items():
@@ -182,6 +186,8 @@ def update_config(client_json):
             else:
                 config[key] = value
 
+    version += 1
+
     # 写回文件
     with open("./config.yaml", "w", encoding="utf-8") as f:
         yaml.dump(config, f)
@@ -2,9 +2,12 @@
 from utilss import embedding
 from utilss import config as CConfig, log as Log
 import yaml
+from utilss.yaml_util import load_yaml
 import time
 import faiss
 import os
+import pickle
+import numpy as np
 import shortuuid
 
 os.environ["KMP_DUPLICATE_LIB_OK"]= "TRUE"
@@ -15,6 +18,7 @@ class Core_Mem:
         self.user = CConfig.config["Agent"]["user"]
         self.thresholds = 0.5
         self.file_path = f"./data/agents/{self.char}/core_mem.yml"
+        self.vect_path = f"./data/agents/{self.char}/core_mem.pkl"
         
     def __init__(self):
         # self.char = config["char"]
@@ -28,7 +32,7 @@ class Core_Mem:
 
         if os.path.exists(self.file_path):
             with open(self.file_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+                data = load_yaml(f)
                 for key in data:
                     self.mems.append(data[key]["text"])
                     self.msgs.append(f"记忆获取时间：{data[key]['time']}\n{data[key]['text']}")
@@ -44,17 +48,47 @@ class Core_Mem:
             with open(self.file_path, "a", encoding="utf-8") as f:
                 yaml.safe_dump(text, f, allow_unicode=True)
             with open(self.file_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+                data = load_yaml(f)
                 for key in data:
                     self.mems.append(data[key]["text"])
                     self.msgs.append(f"记忆获取时间：{data[key]['time']}\n{data[key]['text']}")
                     self.uuid.append(key)
-        vects = embedding.t2vect(self.mems)
+        vects = self.load_vects()
         self.index = faiss.IndexFlatIP(len(vects[0]))
         self.index.add(vects)
 
-    def find_mem(self, msg: str, res_msg: list):
-        D, I = self.index.search(embedding.t2vect([msg]), 5)
+    # 核心记忆只会追加，向量缓存中与当前记忆前缀一致的部分直接复用，只向量化新增的记忆
+    # 缓存记录了生成向量的模型和维度，更换embedding模型后全部重新向量化
+    def load_vects(self):
+        cached_mems, cached_vects = [], None
+        if os.path.exists(self.vect_path):
+            try:
+                with open(self.vect_path, "rb") as f:
+                    tmp_data = pickle.load(f)
+                if tmp_data.get("model") == embedding.MODEL_ID and tmp_data.get("dim") == embedding.dim():
+                    cached_mems, cached_vects = tmp_data["mems"], tmp_data["vect"]
+                else:
+                    Log.logger.info("核心记忆向量缓存与当前embedding模型不一致，重新向量化...")
+            except:
+                Log.logger.error("核心记忆向量缓存读取失败，重新向量化...")
+        n = len(cached_mems)
+        if n == 0 or n > len(self.mems) or cached_mems != self.mems[:n]:
+            n, cached_vects = 0, None
+        if n == len(self.mems):
+            return cached_vects
+        new_vects = embedding.t2vect(self.mems[n:])
+        vects = new_vects if cached_vects is None else np.concatenate([cached_vects, new_vects])
+        self.save_vects(vects)
+        return vects
+
+    def save_vects(self, vects):
+        with open(self.vect_path, "wb") as f:
+            pickle.dump({"mems": list(self.mems), "vect": vects, "model": embedding.MODEL_ID, "dim": len(vects[0])}, f)
+
+    def find_mem(self, msg: str, res_msg: list, vect=None):
+        if vect is None:
+            vect = embedding.t2vect([msg])
+        D, I = self.index.search(vect, 5)
         msg = ""
         for index in range(len(D)):
             for i2 in range(len(D[index])):
@@ -77,4 +111,5 @@ class Core_Mem:
             yaml.safe_dump(m_list, f, allow_unicode=True)
         vects = embedding.t2vect(msg)
         self.index.add(vects)
+        self.save_vects(self.index.reconstruct_n(0, self.index.ntotal))
         Log.logger.info(f"[提示]添加核心记忆{msg}")
@@ -1,5 +1,6 @@
 import os
 import yaml
+from utilss.yaml_util import load_yaml
 import hashlib
 import pickle
 import numpy as np
@@ -41,7 +42,7 @@ class DataBase:
         base_list = {}
         try:
             with open(self.path+"/tmp/label.yaml", "r", encoding="utf-8") as f:
-                base_list = yaml.safe_load(f)
+                base_list = load_yaml(f)
                 if base_list == None:
                     base_list = {}
         except:
@@ -60,7 +61,7 @@ class DataBase:
         # 向量化世界书内容，并单独保存缓存文件
         for index in range(len(books)):
             with open(books_path[index], "r", encoding="utf-8") as f:
-                datas = yaml.safe_load(f)
+                datas = load_yaml(f)
                 try:
                     tmp1 = []
                     tmp2 = []
@@ -103,11 +104,12 @@ class DataBase:
         self.index.add(self.vects)
 
     # 查询接口
-    def search(self, text: list[str]) -> str:
+    def search(self, text: list[str], vect=None) -> str:
         # 储存返回结果
         msg = ""
-        # 向量化查询内容
-        vect = embedding.t2vect(text)
+        # 向量化查询内容，调用方已批量计算时直接使用
+        if vect is None:
+            vect = embedding.t2vect(text)
         # 查询
         D, I = self.index.search(vect, self.top_k)
         # 返回结果
@@ -21,25 +21,36 @@ from utilss import log as Log
 #     return embedding_model.encode(text, prompt_name="query")
 #     # print()
 
+# 当前使用的embedding模型，向量缓存用它判断是否需要重新向量化
+MODEL_ID = "iic/nlp_gte_sentence-embedding_chinese-base"
+MODEL_DIR = "./utilss/models/nlp_gte_sentence-embedding_chinese-base"
+
 # 加载embedding模型
 def load_model():
     return pipeline(
         Tasks.sentence_embedding,
-        model="./utilss/models/nlp_gte_sentence-embedding_chinese-base",
+        model=MODEL_DIR,
         sequence_length=100
     )
 try:
     embedding_model = load_model()
 except:
     Log.logger.warning(f"embedding模型未安装，开始安装embedding模型...")
-    model_id = "iic/nlp_gte_sentence-embedding_chinese-base"
-    local_dir = "./utilss/models/nlp_gte_sentence-embedding_chinese-base"
-    snapshot_download(model_id = model_id, local_dir=local_dir)
+    snapshot_download(model_id = MODEL_ID, local_dir=MODEL_DIR)
     embedding_model = load_model()
 
 def t2vect(text: list[str]) -> np.ndarray[np.ndarray]:
     return embedding_model(input={"source_sentence": text})["text_embedding"]
 
+_dim = None
+
+# 向量维度，首次调用时向量化一句文本得到
+def dim() -> int:
+    global _dim
+    if _dim is None:
+        _dim = len(t2vect(["维度"])[0])
+    return _dim
+
 def test(msg: str, memorys: list, thresholds: float):
     input = {
         "source_sentence": [msg],
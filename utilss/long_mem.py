@@ -1,5 +1,5 @@
 import os
-import yaml
+from utilss.yaml_util import load_yaml
 import jionlp as jio
 import time
 from utilss import embedding, prompt
@@ -7,11 +7,15 @@ from ruamel.yaml import YAML
 from ruamel.yaml.scalarstring import LiteralScalarString
 import numpy as np
 import pickle
+import orjson
 import requests
 import jionlp
 from bisect import bisect_left, bisect_right
 from utilss import config as CConfig, log as Log
 
+# 提取记忆摘要时请求大模型共用的会话，保持长连接
+LLM_SESSION = requests.Session()
+
 class Memorys:
     def update_config(self):
         self.char = CConfig.config["Agent"]["char"]
@@ -28,6 +32,7 @@ class Memorys:
         self.memorys_key = []       # 记录所有记忆的key，秒级整形时间戳。
         self.memorys_data = {}      # 记录所有记忆的文本数据。
         self.vectors = []           # 记录文本tag向量
+        self.vect_matrix = None     # self.vectors 堆叠成的连续float32矩阵，检索时按行切片，记忆变化后重建
         # self.tags = []
         # self.date_time = []
 
@@ -47,7 +52,7 @@ class Memorys:
                     msgs = []
                     tag = []
                     with open(file_path, "r", encoding="utf-8") as f:
-                        data = yaml.safe_load(f)
+                        data = load_yaml(f)
                         for key in data:
                             self.memorys_data[key] = str(data[key]["msg"]).replace("{{user}}", self.user).replace("{{char}}", self.char)
                             tag.append(data[key]["text_tag"])
@@ -89,7 +94,7 @@ class Memorys:
         return [start_idx, end_idx-1]
     
     # 获取与文本相关的记忆
-    def get_memorys(self, msg: str, res_msg: list, t_n: str):
+    def get_memorys(self, msg: str, res_msg: list, t_n: str, q_vect=None):
         if not len(self.memorys_key) > 0:
             return
         # t = time.time()
@@ -120,13 +125,17 @@ class Memorys:
         # 将时间范围内的记忆添加到结果中
         if self.is_check_memorys:
             Log.logger.info(f"深度检索记忆，检索阈值{self.thresholds}")
-            q_v = embedding.t2vect([msg])[0]
+            q_v = (embedding.t2vect([msg]) if q_vect is None else q_vect)[0]
             tmp_msg = ""
-            for index in range(res_index[0]+1, res_index[1]+1):
-                rr = np.dot(self.vectors[index], q_v)
-                if rr >= self.thresholds:
-                    tmp_msg += str(self.memorys_data[self.memorys_key[index]])
-                    tmp_msg += "\n"
+            # 时间范围内的记忆向量一次矩阵乘法算出全部相似度，不再逐条调用np.dot
+            start = res_index[0]+1
+            if self.vect_matrix is None:
+                self.vect_matrix = np.ascontiguousarray(self.vectors, dtype=np.float32)
+            vects = self.vect_matrix[start:res_index[1]+1]
+            scores = vects @ q_v if len(vects) else np.empty(0)
+            for index in np.flatnonzero(scores >= self.thresholds):
+                tmp_msg += str(self.memorys_data[self.memorys_key[start+index]])
+                tmp_msg += "\n"
             if len(tmp_msg) > 0:
                 res_msg.append(tmp_msg)
             # mem_list = []
@@ -150,6 +159,7 @@ class Memorys:
         self.memorys_data[t_n] = m_data["msg"]
         tag_vector = embedding.t2vect([m_data["text_tag"]])[0]
         self.vectors.append(tag_vector)
+        self.vect_matrix = None
         time_st = time.localtime(t_n)
         file_name = f"{time_st.tm_year}-{time_st.tm_mon}-{time_st.tm_mday}.yaml"
         file_pkl = f"{time_st.tm_year}-{time_st.tm_mon}-{time_st.tm_mday}.pkl"
@@ -189,8 +199,8 @@ class Memorys:
         }
         res_tag = ""
         try:
-            res = requests.post(llm_config["api"], json=res_body, headers=headers, timeout=15)
-            res = res.json()["choices"][0]["message"]["content"]
+            res = LLM_SESSION.post(llm_config["api"], data=orjson.dumps(res_body), headers=headers, timeout=15)
+            res = orjson.loads(res.content)["choices"][0]["message"]["content"]
             res = jionlp.remove_html_tag(res).replace(" ", "").replace("\n", "")
             Log.logger.info(f"记录日记结果【{res}】")
             if res.find("日常闲聊") == -1:
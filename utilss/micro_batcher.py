@@ -0,0 +1,67 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    通用请求合并器。
+    收到首个请求后在max_wait_ms内继续收集，最多max_batch条，整批交给dispatch处理。
+    dispatch: async (items) -> list，按顺序返回与items一一对应的结果，某一项为异常对象时只让对应的请求失败。
+    concurrent为False时上一批处理完才收集下一批，适合独占资源的模型推理。
+    """
+
+    def __init__(self, dispatch, max_batch: int, max_wait_ms: int, concurrent: bool = True):
+        self.dispatch = dispatch
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.concurrent = concurrent
+        self.queue = None
+        self.worker = None
+        self.tasks = set()  # 持有进行中批次的引用，防止任务被回收
+
+    async def submit(self, item):
+        if self.worker is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self.run())
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, fut))
+        return await fut
+
+    async def collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.collect()
+            if not self.concurrent:
+                await self.process(batch)
+                continue
+            task = asyncio.create_task(self.process(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def process(self, batch: list):
+        try:
+            results = await self.dispatch([item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
@@ -70,8 +70,9 @@ def handle_client(client_socket: socket, asr_model: AutoModel):
             current_speech_tmp.append(samples)
             if len(current_speech_tmp) < 4:
                 continue
-            resampled = np.concatenate(current_speech_tmp.copy())
-            resampled = (resampled / 32768.0).astype(np.float32)
+            resampled = np.concatenate(current_speech_tmp)
+            # int16直接按float32缩放，一次遍历，不产生float64中间数组（乘2^-15与原来的除法结果完全一致）
+            resampled = np.multiply(resampled, np.float32(1.0 / 32768.0), dtype=np.float32)
             current_speech_tmp = []
             
             for speech_dict, speech_samples in vad_iterator(resampled):
@@ -9,6 +9,7 @@ import io
 class SV:
     def __init__(self, config: dict):
         self.thr = ""
+        self.master_emb = None              # 归一化后的目标声纹向量，首次比对时计算并缓存
         with open(config["master_audio"], "rb") as f:
             audio_bytes = f.read()
         self.master_audio = self.resample_wav_bytes(audio_bytes)
@@ -56,18 +57,20 @@ class SV:
             resampled_data = (resampled_data * 32767).astype(np.int16)
             
             return resampled_data
+    def get_embedding(self, audio) -> np.ndarray:
+        res = self.sv_pipeline([audio], output_emb=True)
+        return np.asarray(res["embs"][0], dtype=np.float32)
+
     def check_speaker(self, speaker_audio: bytes) -> bool:
-        # with open("ttmp.wav", "wb") as f:
-        #     f.write(speaker_audio)
         with io.BytesIO(speaker_audio) as f:
             speaker_audio_1, _ = sf.read(f)
-        res = {}
-        if self.thr:
-            res = self.sv_pipeline([speaker_audio_1, self.master_audio], self.thr)
-        else:
-            res = self.sv_pipeline([speaker_audio_1, self.master_audio])
-        print(f"[声纹识别结果]结果相似度{res['score']}, 目标相似度{self.thr}")
-        if res["text"] == "yes":
-            return True
-        else:
-            return False
\ No newline at end of file
+        # 目标声纹只提取一次并预先归一化，之后每次只需提取输入音频的声纹
+        if self.master_emb is None:
+            master_emb = self.get_embedding(self.master_audio)
+            self.master_emb = master_emb / np.sqrt(np.vdot(master_emb, master_emb))
+        emb = self.get_embedding(speaker_audio_1)
+        # 余弦相似度：输入向量的模长用 vdot 求平方和再开方，省去 np.linalg.norm 的调用开销
+        score = float(np.dot(emb, self.master_emb) / np.sqrt(np.vdot(emb, emb)))
+        thr = float(self.thr) if self.thr else getattr(self.sv_pipeline, "thr", 0.31)
+        print(f"[声纹识别结果]结果相似度{score}, 目标相似度{thr}")
+        return score >= thr
@@ -0,0 +1,10 @@
+import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader  # 优先使用libyaml的C解析器
+except ImportError:
+    from yaml import SafeLoader
+
+
+# 读取yaml文件，等价于yaml.safe_load，可用时走C解析器
+def load_yaml(f):
+    return yaml.load(f, Loader=SafeLoader)
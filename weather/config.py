@@ -4,6 +4,12 @@ import yaml
 from pathlib import Path
 
 
+def _safe_load(f):
+    # 天气服务独立运行，不依赖utilss，这里单独做C解析器的回退
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(f, Loader=loader)
+
+
 def _load_config():
     """
     加载 YAML 配置文件并返回其内容。
@@ -14,7 +20,7 @@ def _load_config():
     
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
+            config_data = _safe_load(f)
         if not config_data:
             raise ValueError("配置文件为空或格式不正确。")
         return config_data
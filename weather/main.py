@@ -3,12 +3,12 @@
 import sys
 import asyncio
 from datetime import date, timedelta
-from typing import List, Tuple
-import geolocation
-import weather_fetcher
-import parsers
-import output
-from parsers import WeatherDataPoint
+from typing import List, Tuple, TYPE_CHECKING
+
+# playwright、bs4、yaml 等依赖导入较慢，等命令行参数校验通过后再在 main() 中导入，
+# 参数错误或只打印用法时不必付出这些开销
+if TYPE_CHECKING:
+    from parsers import WeatherDataPoint
 
 def _parse_user_intent() -> Tuple[int, int]:
     """
@@ -41,10 +41,10 @@ def _parse_user_intent() -> Tuple[int, int]:
 
 
 def _filter_data_by_intent(
-    all_data: List[WeatherDataPoint], 
+    all_data: List["WeatherDataPoint"], 
     days_to_fetch: int, 
     start_offset: int
-) -> List[WeatherDataPoint]:
+) -> List["WeatherDataPoint"]:
     """根据用户的意图筛选出最终需要的数据。"""
     
     start_date = date.today() + timedelta(days=start_offset)
@@ -70,6 +70,11 @@ async def main():
     print("--- 天气查询程序已启动 ---")
 
     try:
+        import geolocation
+        import weather_fetcher
+        import parsers
+        import output
+
         # 获取地理位置
         city = geolocation.get_location()
         